@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'polls.profiling.ProfilingMiddleware',
+    'polls.replica.replica_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,13 +80,123 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# DATABASE_PROFILE picks the connection settings. 'production' is for
+# several workers sharing the SQLite file: write-ahead logging lets reads
+# run alongside the writer, synchronous=NORMAL syncs at checkpoints rather
+# than every commit, writers take the lock when their transaction begins
+# and wait up to DATABASE_BUSY_TIMEOUT seconds for it instead of failing
+# with "database is locked", reads are memory-mapped and connections are
+# kept for DATABASE_CONN_MAX_AGE seconds. `python manage.py bench_sqlite`
+# compares the profiles.
+DATABASE_PROFILES = {
+    'basic': {},
+    'production': {
+        'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=600,
+                               cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': config('DATABASE_BUSY_TIMEOUT', default=20, cast=float),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+            ),
+        },
+    },
+}
+
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='basic')
+if DATABASE_PROFILE not in DATABASE_PROFILES:
+    raise ImproperlyConfigured(
+        f"Unknown DATABASE_PROFILE {DATABASE_PROFILE!r}, choose one of: "
+        f"{', '.join(DATABASE_PROFILES)}.")
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+    },
+}
+# A read replica of the primary, such as a second SQLite file kept in step
+# with it. Set POLLS_REPLICA_DATABASE to 'replica' to have the index,
+# results and exports read from it; see polls.replica.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': config('DATABASE_REPLICA_NAME',
+                   default=str(BASE_DIR / 'replica.sqlite3')),
+}
+
+DATABASE_ROUTERS = ['polls.replica.PrimaryReplicaRouter']
+
+POLLS_REPLICA_DATABASE = config('POLLS_REPLICA_DATABASE', default='')
+# How long a browser reads from the primary after it wrote, enough for
+# the replica to catch up.
+POLLS_REPLICA_STICKY_SECONDS = config('POLLS_REPLICA_STICKY_SECONDS',
+                                      default=10, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The poll listings are only cached in a cache shared by every server
+# process (Memcached, Redis, database, files): a listing change is seen by
+# all of them only there. Under the default LocMemCache, which each process
+# keeps to itself, the listings are not cached; see polls.cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND',
+                          default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='polls'),
     }
 }
 
+# Longest time (seconds) a cached poll listing is served before rebuilding.
+POLLS_LISTING_CACHE_TIMEOUT = config('POLLS_LISTING_CACHE_TIMEOUT',
+                                     default=300, cast=int)
+
+# Live results stream: most events per second per client, and seconds
+# between keepalive comments while nothing changes.
+POLLS_LIVE_UPDATES_PER_SECOND = config('POLLS_LIVE_UPDATES_PER_SECOND',
+                                       default=2, cast=float)
+POLLS_LIVE_HEARTBEAT = config('POLLS_LIVE_HEARTBEAT', default=15, cast=float)
+
+# Write-behind vote buffer: when enabled, votes are queued in memory and
+# written in batches every FLUSH_INTERVAL_MS milliseconds or MAX_BATCH
+# votes. A vote finding the queue (MAX_QUEUE) full waits up to BLOCK_MS
+# milliseconds for room, then is refused with a 503: writing it at once
+# could let an older vote of the same user, still queued, overwrite it.
+POLLS_VOTE_BUFFER = {
+    'ENABLED': config('POLLS_VOTE_BUFFER', default=False, cast=bool),
+    'FLUSH_INTERVAL_MS': config('POLLS_VOTE_BUFFER_FLUSH_MS',
+                                default=200, cast=int),
+    'MAX_BATCH': config('POLLS_VOTE_BUFFER_MAX_BATCH', default=500, cast=int),
+    'MAX_QUEUE': config('POLLS_VOTE_BUFFER_MAX_QUEUE',
+                        default=10000, cast=int),
+    'BLOCK_MS': config('POLLS_VOTE_BUFFER_BLOCK_MS', default=1000, cast=int),
+}
+
+# How long after a poll closes its results are frozen (see polls.snapshots),
+# enough for the votes accepted before then to be written.
+POLLS_SNAPSHOT_GRACE_SECONDS = config('POLLS_SNAPSHOT_GRACE_SECONDS',
+                                      default=60, cast=int)
+
+# Request profiling: the share of requests (0 to 1) whose SQL, template and
+# total times are logged, and whether they're also sent in a Server-Timing
+# response header. The header shows any client the database timings, only
+# turn it on where the clients are developers.
+POLLS_PROFILE_SAMPLE_RATE = config('POLLS_PROFILE_SAMPLE_RATE',
+                                   default=0.01, cast=float)
+POLLS_PROFILE_HEADER = config('POLLS_PROFILE_HEADER', default=False, cast=bool)
+
+# Metrics: directory of the per-process files polls.metrics adds up, off
+# when empty. Clear it on deploy, the files of old processes still count.
+# The scraper sends POLLS_METRICS_TOKEN as a bearer token; without one the
+# endpoint answers nobody.
+POLLS_METRICS_DIR = config('POLLS_METRICS_DIR', default='')
+POLLS_METRICS_TOKEN = config('POLLS_METRICS_TOKEN', default='')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -137,35 +250,29 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# The polls logger writes through polls.logs.QueueHandler: in the server
+# process, records are queued on the request path and written in batches by
+# a background thread to polls.log and the console. A full queue drops
+# records ('drop') or waits briefly for room ('block'). polls.log is
+# rotated externally, e.g. by logrotate.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'details': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
-        },
-    },
     'handlers': {
-        'file': {
+        'queue': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'polls.logs.QueueHandler',
             'filename': 'polls.log',
-            'formatter': 'details',
-        },
-        'console': {
-            'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            'json': config('POLLS_LOG_JSON', default=False, cast=bool),
+            'console_level': 'INFO',
+            'queue_size': config('POLLS_LOG_QUEUE_SIZE', default=10000,
+                                 cast=int),
+            'policy': config('POLLS_LOG_QUEUE_POLICY', default='drop'),
         },
     },
     'loggers': {
         'polls': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': True,
         },
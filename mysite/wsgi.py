@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_wsgi_application()
+
+# Only the server process runs the log writer thread, management commands
+# log synchronously.
+from polls import logs  # noqa: E402
+
+logs.start()
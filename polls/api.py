@@ -0,0 +1,176 @@
+"""
+Read-only JSON API of the published polls.
+
+    api/questions/             a page of questions, see polls.pagination
+    api/questions/<id>/        one question with its choices
+    api/questions/<id>/results/  its tallies
+    api/questions/batch/?ids=1,2,3  up to MAX_BATCH questions at once
+
+?fields= picks the question fields to send, out of QUESTION_FIELDS, and
+only those columns are read. Choices, with their tallies, are fetched in
+one more query for however many questions, so a batch takes two queries
+whatever its size. Responses are built as dictionaries and encoded by
+JsonResponse, without the template engine, CSRF tokens or messages. Like
+the results page, the results of a frozen poll come from its snapshot
+(see polls.snapshots) rather than from its choices.
+"""
+from functools import wraps
+
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404, JsonResponse
+
+from . import pagination, snapshots
+from .models import Choice, Question, ResultSnapshot
+from .replica import reads_from_replica
+
+QUESTION_FIELDS = ('id', 'question_text', 'pub_date', 'end_date',
+                   'voting_open', 'vote_total', 'choices')
+LIST_FIELDS = ('id', 'question_text', 'pub_date', 'end_date', 'voting_open')
+RESULT_FIELDS = ('id', 'vote_total', 'choices')
+COLUMNS = ('question_text', 'pub_date', 'end_date', 'vote_total')
+MAX_BATCH = 100
+# The largest primary key, that of a signed 64-bit BigAutoField.
+MAX_ID = 2**63 - 1
+
+
+class BadRequest(Exception):
+    """A request the API answers with 400 and the message."""
+
+
+def api_view(view):
+    """Decorate a read-only API view: GET only, reads from the replica,
+    errors as JSON."""
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return JsonResponse({'error': "Method not allowed."}, status=405,
+                                headers={'Allow': 'GET, HEAD'})
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404 as error:
+            return JsonResponse({'error': str(error) or "Not found."},
+                                status=404)
+    return reads_from_replica(inner)
+
+
+def requested_fields(request, default):
+    """Return the ?fields= of request, default when there are none."""
+    value = request.GET.get('fields')
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(
+        field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in QUESTION_FIELDS]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Choose "
+                         f"from {', '.join(QUESTION_FIELDS)}.")
+    return fields
+
+
+def questions(fields, extra=()):
+    """Return the questions, loading only what fields need and the columns
+    in extra."""
+    queryset = Question.objects.only(
+        'id', *[column for column in COLUMNS
+                if column in fields or column in extra])
+    if 'voting_open' in fields:
+        queryset = queryset.with_voting_open()
+    if 'choices' in fields:
+        queryset = queryset.prefetch_related(_choices())
+    return queryset
+
+
+def _choices():
+    return Prefetch('choice_set', to_attr='api_choices',
+                    queryset=Choice.objects.only(
+                        'id', 'question_id', 'choice_text', 'vote_count'
+                    ).order_by('pk'))
+
+
+def serialize(question, fields):
+    """Return the fields of question as a dictionary."""
+    data = {}
+    for field in fields:
+        if field == 'choices':
+            data['choices'] = [
+                {'id': choice.pk, 'choice_text': choice.choice_text,
+                 'votes': choice.votes}
+                for choice in question.api_choices]
+        else:
+            data[field] = getattr(question, field)
+    return data
+
+
+def _published(queryset, pk):
+    try:
+        return queryset.published().get(pk=pk)
+    except Question.DoesNotExist:
+        raise Http404("Question not found.")
+
+
+def _get(request, pk, default):
+    fields = requested_fields(request, default)
+    question = _published(questions(fields), pk)
+    return JsonResponse(serialize(question, fields))
+
+
+@api_view
+def question_list(request):
+    """A page of questions, with the cursor of the next one."""
+    fields = requested_fields(request, LIST_FIELDS)
+    name, position = pagination.from_request(request)
+    page, cursor = pagination.split(list(pagination.queryset(
+        name, position, questions=questions(fields, extra=['pub_date']))))
+    return JsonResponse({
+        'questions': [serialize(question, fields) for question in page],
+        'next': cursor,
+    })
+
+
+@api_view
+def question_detail(request, pk):
+    return _get(request, pk, QUESTION_FIELDS)
+
+
+@api_view
+def question_results(request, pk):
+    """The tallies of a question, frozen ones once it has a snapshot."""
+    fields = requested_fields(request, RESULT_FIELDS)
+    question = _published(questions(
+        [field for field in fields if field != 'choices'],
+        extra=['pub_date', 'end_date']), pk)
+    if snapshots.freezable(question):
+        snapshot = (ResultSnapshot.objects.filter(pk=pk).first()
+                    or snapshots.freeze(question))
+        question.vote_total = snapshot.total
+        question.api_choices = snapshot.choices()
+    elif 'choices' in fields:
+        prefetch_related_objects([question], _choices())
+    return JsonResponse(serialize(question, fields))
+
+
+@api_view
+def question_batch(request):
+    """The questions of ?ids=, in that order. Ids of no published
+    question are listed under missing."""
+    fields = requested_fields(request, QUESTION_FIELDS)
+    try:
+        ids = list(dict.fromkeys(
+            int(pk) for pk in request.GET.get('ids', '').split(',') if pk))
+    except ValueError:
+        raise BadRequest("ids must be a comma-separated list of integers.")
+    # The database can't even compare an id out of range.
+    if any(not 1 <= pk <= MAX_ID for pk in ids):
+        raise BadRequest(f"ids must be between 1 and {MAX_ID}.")
+    if not ids:
+        raise BadRequest("Pass the question ids as ?ids=1,2,3.")
+    if len(ids) > MAX_BATCH:
+        raise BadRequest(f"At most {MAX_BATCH} ids at a time.")
+    found = questions(fields).published().in_bulk(ids)
+    return JsonResponse({
+        'questions': [serialize(found[pk], fields)
+                      for pk in ids if pk in found],
+        'missing': [pk for pk in ids if pk not in found],
+    })
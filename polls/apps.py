@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PollsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        # Connect the tally, cache, change marker and snapshot receivers,
+        # and the profiler's query hook before any connection opens.
+        from . import (cache, conditional, profiling,  # noqa: F401
+                       snapshots, tallies)
@@ -0,0 +1,213 @@
+"""
+Async views for the ASGI stack: versions of the index, results and vote
+views, and the live results stream.
+
+They read through Django's async ORM and cache APIs so that, under an
+ASGI server, a request doesn't tie up a worker thread while it waits on
+the database. Django has no async transactions yet, so the vote write
+itself still runs Vote.objects.cast() through sync_to_async.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+
+from . import cache as listing_cache
+from . import conditional, live, metrics, pagination, snapshots
+from .api import MAX_ID
+from .buffer import get_buffer
+from .models import Choice, Question, ResultSnapshot, Vote
+from .replica import reads_from_replica
+from .views import BUSY_MESSAGE, results_context
+
+logger = logging.getLogger('polls')
+
+
+async def arender(request, template_name, context, status=None):
+    """
+    Render a template from an async view. Loading the user first also
+    loads the session, so templates never touch the database.
+    """
+    context['user'] = await request.auser()
+    return render(request, template_name, context, status=status)
+
+
+@reads_from_replica
+async def index(request):
+    name, position = pagination.from_request(request)
+
+    async def page():
+        return pagination.split([question async for question in
+                                 pagination.queryset(name, position)])
+
+    if name == 'all' and position is None:
+        questions, next_cursor = await listing_cache.alisting('index:all',
+                                                              page)
+    else:
+        questions, next_cursor = await page()
+    return await arender(request, 'polls/index.html', {
+        'latest_question_list': questions,
+        'filter': name,
+        'filters': pagination.FILTERS,
+        'next_cursor': next_cursor,
+    })
+
+
+@reads_from_replica
+@cache_control(no_cache=True)
+@conditional.acondition(conditional.aresults_etag)
+async def results(request, pk):
+    # SQLite can't even compare a larger id with a foreign key.
+    if pk > MAX_ID:
+        raise Http404("No question found.")
+    if conditional.has_snapshot(request, pk):
+        snapshot = await ResultSnapshot.objects.select_related(
+            'question').filter(pk=pk).afirst()
+        if snapshot is not None:
+            context = results_context(snapshot.choices())
+            context.update(question=snapshot.question,
+                           live=live.available(request))
+            return await arender(request, 'polls/results.html', context)
+    choices = [choice async for choice in Choice.objects.filter(
+        question_id=pk).select_related('question').order_by('pk')]
+    if choices:
+        question = choices[0].question
+    else:
+        question = await aget_object_or_404(Question, pk=pk)
+    if snapshots.freezable(question):
+        choices = (await sync_to_async(snapshots.freeze)(question)).choices()
+    context = results_context(choices)
+    context.update(question=question, live=live.available(request))
+    return await arender(request, 'polls/results.html', context)
+
+
+async def results_stream(request, pk):
+    """
+    Server-Sent Events stream of a question's tallies, fed by live.hub.
+    The first event carries every count, later ones only the choices that
+    changed, at most POLLS_LIVE_UPDATES_PER_SECOND events a second.
+    """
+    if not live.available(request):
+        raise Http404("Live results need an ASGI server.")
+    question = await aget_object_or_404(Question, pk=pk)
+
+    def load():
+        # One query, so the counts and the version agree.
+        rows = Choice.objects.filter(question=question).values_list(
+            'pk', 'vote_count', 'question__tally_version')
+        counts = {pk: votes for pk, votes, _ in rows}
+        return counts, max((version for _, _, version in rows), default=0)
+
+    interval = 1 / settings.POLLS_LIVE_UPDATES_PER_SECOND
+
+    async def events():
+        sent = {}
+        sent_version = None
+        async for version, current in live.hub.updates(
+                question.pk, load, settings.POLLS_LIVE_HEARTBEAT):
+            if version == sent_version:
+                yield ": keepalive\n\n"
+                continue
+            changed = {str(choice_id): votes
+                       for choice_id, votes in current.items()
+                       if sent.get(choice_id) != votes}
+            sent, sent_version = current, version
+            data = json.dumps({'counts': changed,
+                               'total': sum(current.values())})
+            yield f"id: {version}\nevent: tally\ndata: {data}\n\n"
+            # Later changes pile up in the hub and go out as one event.
+            await asyncio.sleep(interval)
+
+    return StreamingHttpResponse(events(), content_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache',
+                                          'X-Accel-Buffering': 'no'})
+
+
+async def _previous_vote(user, question):
+    return await Vote.objects.select_related('choice').filter(
+        user=user, question=question).afirst()
+
+
+@login_required
+@metrics.VOTE_SECONDS.time()
+async def vote(request, question_id):
+    try:
+        question = await Question.objects.with_voting_open(
+            ).prefetch_related('choice_set').aget(pk=question_id)
+    except Question.DoesNotExist:
+        logger.error(f"Question with id: {question_id} not found")
+        raise Http404("Question not found.")
+
+    user = await request.auser()
+
+    if not question.voting_open:
+        if request.method == 'POST':
+            metrics.VOTES_REJECTED.inc(reason='closed')
+        return await arender(request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "The Question is not pending currently.",
+        })
+
+    if request.method == 'POST':
+        try:
+            selected_choice = await question.choice_set.aget(
+                pk=request.POST['choice'])
+        except (KeyError, ValueError, Choice.DoesNotExist):
+            logger.warning("Invalid question id or didn't selected choice")
+            metrics.VOTES_REJECTED.inc(reason='no_choice')
+            return await arender(request, 'polls/detail.html', {
+                'question': question,
+                'error_message': "You didn't select a choice.",
+                'user_vote': await _previous_vote(user, question),
+            })
+
+        vote_buffer = get_buffer()
+        if vote_buffer:
+            # Waiting for room must not hold up the event loop.
+            if not (vote_buffer.submit(user.pk, selected_choice)
+                    or await sync_to_async(vote_buffer.submit)(
+                        user.pk, selected_choice, block=True)):
+                metrics.VOTES_REJECTED.inc(reason='busy')
+                return await arender(request, 'polls/detail.html', {
+                    'question': question,
+                    'error_message': BUSY_MESSAGE,
+                }, status=503)
+            messages.success(request, f"Your vote "
+                             f"'{selected_choice.choice_text}'"
+                             f"was received.")
+            metrics.VOTES_ACCEPTED.inc()
+            logger.info("Vote queued for poll #{0}".format(question_id))
+            return HttpResponseRedirect(reverse('polls:async_results',
+                                                args=(question.id,)))
+
+        _, previous_choice = await sync_to_async(Vote.objects.cast)(
+            user, selected_choice)
+        if previous_choice == selected_choice:
+            messages.info(request, f"You already voted for"
+                          f"'{previous_choice.choice_text}'.")
+        else:
+            if previous_choice:
+                messages.info(request, f"Your previous vote for"
+                              f"'{previous_choice.choice_text}'"
+                              f"has been removed.")
+            messages.success(request, f"Your vote "
+                             f"'{selected_choice.choice_text}'"
+                             f"was recorded.")
+        metrics.VOTES_ACCEPTED.inc()
+
+        logger.info("Vote submitted for poll #{0}".format(question_id))
+        return HttpResponseRedirect(reverse('polls:async_results',
+                                            args=(question.id,)))
+
+    return await arender(request, 'polls/detail.html', {
+        'question': question,
+        'user_vote': await _previous_vote(user, question),
+    })
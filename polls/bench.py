@@ -0,0 +1,132 @@
+"""
+Helpers shared by the benchmark management commands.
+
+seed() fills the database with a synthetic poll catalog using bulk
+inserts, and timed() / percentile() measure what the commands run
+against it. Run the benchmarks against a scratch database, not one
+holding real votes.
+"""
+import datetime
+import os
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from . import tallies
+from .models import Choice, Question, Vote
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    """Raised to discard everything a benchmark wrote."""
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile (0-100) of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed(func, repeat=20):
+    """Call func repeat times, return the median wall time in ms."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def allow_test_client():
+    """
+    Let the test client's host through ALLOWED_HOSTS; outside the test
+    runner every request would otherwise be rejected with a 400.
+    """
+    return override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+
+
+def rss_mb():
+    """Return the resident set size of this process in MB (Linux only)."""
+    with open('/proc/self/statm') as statm:
+        pages = int(statm.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def seed(questions, votes, choices=4, skew=0.0, prefix='bench', rng=None):
+    """
+    Create ``questions`` polls with ``choices`` choices each and about
+    ``votes`` votes, then rebuild the tallies.
+
+    A tenth of the polls are scheduled in the future and a third have
+    closed. With ``skew`` > 0 question popularity follows a Zipf-like
+    curve (weight 1 / rank ** skew), so a few polls get most votes.
+    Returns the ids of the created users and questions.
+    """
+    rng = rng or random.Random(0)
+    now = timezone.now()
+    with transaction.atomic():
+        question_objs = []
+        for n in range(questions):
+            pub_date = now - datetime.timedelta(minutes=rng.randint(1, 10**6))
+            end_date = None
+            roll = rng.random()
+            if roll < 0.1:
+                pub_date = now + datetime.timedelta(days=rng.randint(1, 30))
+            elif roll < 0.43:
+                end_date = pub_date + datetime.timedelta(
+                    minutes=rng.randint(1, 10**4))
+            elif roll < 0.7:
+                end_date = now + datetime.timedelta(days=rng.randint(1, 30))
+            question_objs.append(Question(
+                question_text=f"{prefix} question {n}",
+                pub_date=pub_date, end_date=end_date))
+        question_objs = Question.objects.bulk_create(
+            question_objs, batch_size=BATCH_SIZE)
+        question_ids = [q.pk for q in question_objs]
+
+        choice_objs = Choice.objects.bulk_create(
+            (Choice(question_id=question_id, choice_text=f"choice {c}")
+             for question_id in question_ids for c in range(choices)),
+            batch_size=BATCH_SIZE)
+        choices_of = {}
+        for choice in choice_objs:
+            choices_of.setdefault(choice.question_id, []).append(choice.pk)
+
+        # Each user votes on up to per_user distinct questions.
+        per_user = max(1, min(len(question_ids), 50))
+        user_count = max(1, -(-votes // per_user))
+        start = User.objects.count()
+        user_objs = User.objects.bulk_create(
+            (User(username=f"{prefix}{start + n}", password='!')
+             for n in range(user_count)),
+            batch_size=BATCH_SIZE)
+        user_ids = [u.pk for u in user_objs]
+
+        weights = [1 / (rank + 1) ** skew for rank in range(len(question_ids))]
+        vote_objs = []
+        remaining = votes
+        for user_id in user_ids:
+            picks = dict.fromkeys(rng.choices(question_ids, weights,
+                                              k=min(per_user, remaining) * 2))
+            for question_id in list(picks)[:min(per_user, remaining)]:
+                vote_objs.append(Vote(
+                    user_id=user_id, question_id=question_id,
+                    choice_id=rng.choice(choices_of[question_id])))
+            remaining -= min(per_user, remaining)
+            if len(vote_objs) >= BATCH_SIZE:
+                Vote.objects.bulk_create(vote_objs)
+                vote_objs = []
+        Vote.objects.bulk_create(vote_objs)
+        tallies.rebuild()
+    return user_ids, question_ids
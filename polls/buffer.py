@@ -0,0 +1,152 @@
+"""
+Write-behind buffer for votes.
+
+With POLLS_VOTE_BUFFER['ENABLED'] the vote views hand each vote to a
+bounded in-process queue instead of writing it. A background thread
+drains the queue every FLUSH_INTERVAL_MS milliseconds, or as soon as
+MAX_BATCH votes are waiting, and records the batch with
+Vote.objects.cast_many() in a single transaction: one vote per user per
+question, the latest one winning, and the tallies moved in step. If the
+batch fails, for instance on a choice deleted since its vote was queued,
+each vote is retried on its own so the others are still recorded; votes
+failing alone are dropped, logged and counted in metrics. The votes are
+written in the order they were queued, so a user's latest vote wins; a
+vote that finds the queue full is refused rather than written ahead of
+the queue.
+
+A vote is only durable once its batch is flushed. The queue is drained on
+a normal interpreter exit, but votes still queued when a process is
+killed are lost, and the results page can lag a submitted vote by up to
+one flush interval.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+from .models import Vote
+
+logger = logging.getLogger('polls')
+
+
+class VoteBuffer:
+
+    def __init__(self, flush_interval=0.2, max_batch=500, max_queue=10000,
+                 block_timeout=1.0):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(max_queue)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, choice, block=False):
+        """
+        Queue a vote, waiting up to block_timeout seconds for room with
+        block. Return False when the queue is full. The caller mustn't
+        write the vote itself then: an earlier vote of the user, still
+        queued, would be written after it and win.
+        """
+        try:
+            if block:
+                self._queue.put((user_id, choice), timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait((user_id, choice))
+        except queue.Full:
+            return False
+        return True
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name='polls-vote-buffer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _take(self, timeout):
+        """Wait up to timeout seconds for up to max_batch queued votes."""
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take(self.flush_interval)
+            if batch:
+                self._write(batch)
+        close_old_connections()
+
+    def _write(self, batch):
+        try:
+            Vote.objects.cast_many(batch)
+        except Exception:
+            logger.warning(f"Failed to write {len(batch)} buffered vote(s) "
+                           f"at once, writing them one by one",
+                           exc_info=True)
+            for vote in batch:
+                self._write_one(vote)
+        else:
+            logger.debug(f"Flushed {len(batch)} buffered vote(s)")
+
+    def _write_one(self, vote):
+        user_id, choice = vote
+        try:
+            Vote.objects.cast_many([vote])
+        except Exception:
+            metrics.BUFFERED_VOTES_DROPPED.inc()
+            logger.exception(f"Dropped the buffered vote of user {user_id} "
+                             f"for choice {choice.pk}")
+
+    def flush(self):
+        """Write every queued vote now, in the calling thread."""
+        while True:
+            batch = self._take(0)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still queued."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join()
+            atexit.unregister(self.stop)
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return the process's vote buffer, or None when it is disabled."""
+    global _buffer
+    options = settings.POLLS_VOTE_BUFFER
+    if not options['ENABLED']:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VoteBuffer(options['FLUSH_INTERVAL_MS'] / 1000,
+                                 options['MAX_BATCH'], options['MAX_QUEUE'],
+                                 options['BLOCK_MS'] / 1000)
+            _buffer.start()
+    return _buffer
@@ -0,0 +1,153 @@
+"""
+Versioned cache for the poll listings.
+
+Listings are stored under the current listing version. Saving or deleting
+a Question bumps the version once the change is committed, so every
+cached listing is dropped at once without having to know their keys. A
+listing also expires when the next scheduled question is due to be
+published. Hits and misses are counted in the cache so the hit rate can
+be checked with ``manage.py cache_stats``.
+
+The version only invalidates listings for every process when the cache is
+shared between them (Memcached, Redis, the database or files). With the
+process-local LocMemCache a bump would reach one worker while the others
+kept serving stale listings, so listings are then not cached at all.
+
+A listing is always built from the primary, even in a view reading from
+the replica: built from a lagging replica right after a bump, it would
+be served to everyone until the next bump or its timeout.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .replica import primary_reads
+from .models import Question
+
+VERSION_KEY = 'polls:listing:version'
+HITS_KEY = 'polls:listing:hits'
+MISSES_KEY = 'polls:listing:misses'
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def version():
+    """Return the current listing version."""
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # Start from the clock so a version lost to eviction never
+        # revives listings cached under an earlier one.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def bump():
+    """Invalidate every cached listing."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def shared():
+    """Whether listings are cached: only in a cache every process sees."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def _upcoming():
+    return Question.objects.filter(pub_date__gt=timezone.now())
+
+
+def _timeout(upcoming):
+    """Seconds the listings stay fresh, up to the next scheduled publish."""
+    timeout = settings.POLLS_LISTING_CACHE_TIMEOUT
+    if upcoming is not None:
+        due = (upcoming - timezone.now()).total_seconds()
+        timeout = max(1, min(timeout, int(due) + 1))
+    return timeout
+
+
+def listing(name, build):
+    """Return the listing called name, calling build() on a miss."""
+    if not shared():
+        return build()
+    current = version()
+    result = cache.get(name, version=current)
+    if result is not None:
+        _incr(HITS_KEY)
+        metrics.LISTING_CACHE.inc(result='hit')
+        return result
+    _incr(MISSES_KEY)
+    metrics.LISTING_CACHE.inc(result='miss')
+    with primary_reads():
+        result = build()
+        upcoming = _upcoming().aggregate(next=Min('pub_date'))['next']
+    cache.set(name, result, _timeout(upcoming), version=current)
+    return result
+
+
+async def _aincr(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 1, None)
+
+
+async def aversion():
+    """Async version of version()."""
+    current = await cache.aget(VERSION_KEY)
+    if current is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), None)
+        current = await cache.aget(VERSION_KEY)
+    return current
+
+
+async def alisting(name, abuild):
+    """Async version of listing(), abuild is a coroutine function."""
+    if not shared():
+        return await abuild()
+    current = await aversion()
+    result = await cache.aget(name, version=current)
+    if result is not None:
+        await _aincr(HITS_KEY)
+        metrics.LISTING_CACHE.inc(result='hit')
+        return result
+    await _aincr(MISSES_KEY)
+    metrics.LISTING_CACHE.inc(result='miss')
+    with primary_reads():
+        result = await abuild()
+        upcoming = (await _upcoming().aaggregate(
+            next=Min('pub_date')))['next']
+    await cache.aset(name, result, _timeout(upcoming), version=current)
+    return result
+
+
+def stats():
+    """Return the listing cache hits, misses and hit ratio."""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses,
+            'ratio': hits / total if total else 0.0}
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_listings(sender, using, **kwargs):
+    # After the commit: a listing rebuilt between a bump and the commit
+    # would cache the old rows under the new version.
+    transaction.on_commit(bump, using=using)
@@ -0,0 +1,101 @@
+"""
+Conditional GET support for the question pages.
+
+Question.modified is a cheap per-question change marker: saving the
+question sets it, polls.tallies moves it with every vote, and the
+receivers below move it when a choice changes. The detail and results
+views answer If-None-Match from it with a 304 Not Modified, before
+loading choices or rendering a template. The same lookup tells the
+results views whether the question's results are frozen (see
+polls.snapshots).
+
+There is no Last-Modified: it only has one-second resolution while votes
+move the marker many times a second, so an If-Modified-Since could be
+answered 304 for stale tallies.
+"""
+from functools import wraps
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .models import Choice, Question
+
+
+def _markers(pk):
+    return Question.objects.with_voting_open().filter(pk=pk).values_list(
+        'modified', 'voting_open', 'snapshot')
+
+
+def _marker(request, pk):
+    """Return (modified, open for voting, snapshot id) for the question,
+    or None."""
+    markers = request.__dict__.setdefault('_question_markers', {})
+    if pk not in markers:
+        markers[pk] = _markers(pk).first()
+    return markers[pk]
+
+
+def has_snapshot(request, pk):
+    """Whether the marker looked up for the request found the question's
+    results frozen. False when no marker was looked up."""
+    marker = request.__dict__.get('_question_markers', {}).get(pk)
+    return bool(marker and marker[2] is not None)
+
+
+def _results_etag(pk, marker):
+    if marker and marker[2] is not None:
+        # Frozen counts never change, but the question's text can.
+        return f"results-{pk}-frozen-{marker[0].timestamp()}"
+    return marker and f"results-{pk}-{marker[0].timestamp()}"
+
+
+def results_etag(request, pk):
+    return _results_etag(pk, _marker(request, pk))
+
+
+def detail_etag(request, pk):
+    """
+    The detail form is only cacheable while voting is open, and its CSRF
+    token belongs to the session, so the ETag also names the user.
+    """
+    marker = _marker(request, pk)
+    if marker is None or not marker[1]:
+        return None
+    return f"detail-{pk}-{marker[0].timestamp()}-{request.user.pk or 0}"
+
+
+async def aresults_etag(request, pk):
+    markers = request.__dict__.setdefault('_question_markers', {})
+    if pk not in markers:
+        markers[pk] = await _markers(pk).afirst()
+    return _results_etag(pk, markers[pk])
+
+
+def acondition(etag_func):
+    """
+    Async counterpart of django.views.decorators.http.condition for an
+    async etag_func, which Django's decorator would call synchronously.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if etag and request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def touch_question(sender, instance, **kwargs):
+    Question.objects.filter(pk=instance.question_id).update(
+        modified=timezone.now())
@@ -0,0 +1,115 @@
+"""
+Streaming exports of the votes and of the per-choice results.
+
+Rows are read in pages walked by primary key (WHERE pk > last ORDER BY pk
+LIMIT n) rather than by OFFSET, so every page costs the same, and each
+page is consumed with iterator() so no queryset caches it. Only one page
+is held at a time: memory stays flat however large the Vote table grows.
+Under ASGI, aexport() hands the same lines to the event loop page by page.
+"""
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Choice, Vote
+
+PAGE_SIZE = 5000
+
+VOTE_FIELDS = ('id', 'user_id', 'username', 'question_id', 'choice_id',
+               'choice_text')
+RESULT_FIELDS = ('question_id', 'question_text', 'pub_date', 'end_date',
+                 'choice_id', 'choice_text', 'votes', 'question_votes')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _pages(queryset, fields, page_size):
+    """Yield every row of queryset as a tuple, one keyset page at a time."""
+    queryset = queryset.order_by('pk').values_list(*fields)
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        count = 0
+        for row in page[:page_size].iterator(chunk_size=page_size):
+            count += 1
+            last = row[0]
+            yield row
+        if count < page_size:
+            return
+
+
+def vote_rows(page_size=PAGE_SIZE, using=None):
+    """Yield one tuple of VOTE_FIELDS per vote."""
+    return _pages(Vote.objects.using(using),
+                  ('pk', 'user_id', 'user__username', 'question_id',
+                   'choice_id', 'choice__choice_text'), page_size)
+
+
+def result_rows(page_size=PAGE_SIZE, using=None):
+    """Yield one tuple of RESULT_FIELDS per choice, by question."""
+    rows = _pages(Choice.objects.using(using),
+                  ('pk', 'question_id', 'question__question_text',
+                   'question__pub_date', 'question__end_date', 'choice_text',
+                   'vote_count', 'question__vote_total'), page_size)
+    for (choice_id, question_id, text, pub_date, end_date, choice_text,
+         votes, total) in rows:
+        yield (question_id, text, pub_date, end_date, choice_id, choice_text,
+               votes, total)
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes."""
+
+    def write(self, value):
+        return value
+
+
+def as_csv(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def as_ndjson(fields, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def render(fmt, fields, rows):
+    """Yield the rows as lines of text in fmt, one of FORMATS."""
+    if fmt == 'csv':
+        return as_csv(fields, rows)
+    return as_ndjson(fields, rows)
+
+
+DATASETS = {
+    'votes': (VOTE_FIELDS, vote_rows),
+    'results': (RESULT_FIELDS, result_rows),
+}
+
+
+def export(dataset, fmt, page_size=PAGE_SIZE, using=None):
+    """Yield the lines of dataset (a DATASETS key) in fmt, read from the
+    database alias using (None for the router's choice)."""
+    fields, rows = DATASETS[dataset]
+    return render(fmt, fields, rows(page_size, using))
+
+
+async def aexport(dataset, fmt, page_size=PAGE_SIZE, using=None):
+    """
+    Async version of export() for ASGI responses. Each page of lines is
+    read in the sync thread and handed over as one chunk, so the event loop
+    isn't blocked and the export isn't gathered into a list first.
+    """
+    lines = export(dataset, fmt, page_size, using)
+    next_page = sync_to_async(lambda: list(islice(lines, page_size)))
+    while page := await next_page():
+        yield ''.join(page)
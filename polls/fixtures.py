@@ -0,0 +1,119 @@
+"""
+Streaming load of large fixtures.
+
+iter_objects() reads a JSON fixture, the top-level array written by
+dumpdata, one object at a time, so a file never has to fit in memory.
+write() saves a batch of deserialized objects with one bulk insert per
+model, replacing rows that already exist. Nothing is saved through
+Model.save(), so no signals are sent: the caller rebuilds the tallies
+and drops the cached listings once everything is in.
+"""
+import json
+from itertools import islice
+
+from .models import Choice, Vote
+
+READ_SIZE = 1 << 16
+
+
+def iter_objects(stream, read_size=READ_SIZE):
+    """Yield each object of the JSON array read from a text stream."""
+    decoder = json.JSONDecoder()
+    buffer, pos = '', 0
+    expect = '['
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            chunk = stream.read(read_size)
+            if not chunk:
+                raise ValueError("The fixture ends before its array does.")
+            buffer, pos = chunk, 0
+            continue
+        char = buffer[pos]
+        if expect == '[':
+            if char != '[':
+                raise ValueError("A fixture must be a JSON array.")
+            pos, expect = pos + 1, 'first'
+        elif char == ']' and expect in ('first', ','):
+            return
+        elif expect == ',':
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']', found {char!r}.")
+            pos, expect = pos + 1, 'object'
+        else:
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The object runs past the buffer, read on and retry.
+                chunk = stream.read(read_size)
+                if not chunk:
+                    raise
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            if not isinstance(obj, dict):
+                raise ValueError("A fixture must be an array of objects.")
+            yield obj
+            pos, expect = end, ','
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _fill_questions(votes):
+    """Set each vote's question from its choice, older fixtures lack it."""
+    questions = dict(Choice.objects.filter(
+        pk__in={vote.choice_id for vote in votes}).values_list(
+            'pk', 'question_id'))
+    for vote in votes:
+        if vote.question_id is None:
+            try:
+                vote.question_id = questions[vote.choice_id]
+            except KeyError:
+                raise ValueError(f"Vote {vote.pk} is for choice "
+                                 f"{vote.choice_id}, which doesn't exist.")
+
+
+def _write_votes(votes):
+    # A vote is known by its user and question, not by the fixture's
+    # primary key, and a later vote replaces an earlier one.
+    _fill_questions(votes)
+    latest = {}
+    for vote in votes:
+        vote.pk = None
+        latest[(vote.user_id, vote.question_id)] = vote
+    Vote.objects.bulk_create(latest.values(), update_conflicts=True,
+                             unique_fields=['user', 'question'],
+                             update_fields=['choice'])
+
+
+def _write(model, objects):
+    if model is Vote:
+        _write_votes(objects)
+        return
+    pk = model._meta.pk
+    model._default_manager.bulk_create(
+        objects, update_conflicts=True, unique_fields=[pk.name],
+        update_fields=[field.name for field in model._meta.concrete_fields
+                       if field is not pk])
+
+
+def write(deserialized):
+    """
+    Save a batch of DeserializedObjects, one bulk insert per model in the
+    order the models first appear. Return the set of models written.
+    """
+    by_model = {}
+    for item in deserialized:
+        by_model.setdefault(type(item.object), []).append(item)
+    for model, items in by_model.items():
+        _write(model, [item.object for item in items])
+        for item in items:
+            for name, values in (item.m2m_data or {}).items():
+                if values:
+                    getattr(item.object, name).set(values)
+    return set(by_model)
@@ -0,0 +1,121 @@
+"""
+In-process fan-out of live vote tallies for the results stream.
+
+polls.tallies publishes every committed tally change to the hub, which
+keeps the current counts of each watched question in memory and wakes
+that question's streams. A stream therefore never polls the database: the
+counts are read once, when a question gains its first watcher, and are
+dropped again when its last watcher leaves. Each process has its own hub,
+fed by the votes that process records.
+
+A change is published after its commit, so one committed just before the
+counts are read would be counted twice. The counts are therefore read
+with their question's tally_version, and only changes with a later
+version are added to them.
+
+A stream holds its connection open for as long as the page is shown, which
+only an ASGI server can afford: under WSGI, Django would drain the whole
+endless stream in one worker thread before sending anything. The stream
+is therefore only served, and only subscribed to, under ASGI.
+"""
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+def available(request):
+    """Whether request can be answered with a live stream."""
+    return isinstance(request, ASGIRequest)
+
+
+class TallyHub:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}      # question id -> {choice id: votes}
+        self._questions = {}   # watched choice id -> question id
+        self._versions = {}    # question id -> number of changes seen
+        self._loaded = {}      # question id -> tally_version of the counts
+        self._waiters = {}     # question id -> {(loop, event)}
+
+    def watching(self, question_id):
+        with self._lock:
+            return question_id in self._counts
+
+    def publish(self, choice_deltas, versions=None):
+        """Apply committed tally deltas, keyed by choice id. versions holds
+        the tally_version the commit gave each question."""
+        versions = versions or {}
+        woken = set()
+        with self._lock:
+            for choice_id, delta in choice_deltas.items():
+                question_id = self._questions.get(choice_id)
+                if question_id is None or not delta:
+                    continue
+                if versions.get(question_id, 0) <= self._loaded[question_id]:
+                    continue  # Already in the loaded counts.
+                self._counts[question_id][choice_id] += delta
+                self._versions[question_id] += 1
+                woken.update(self._waiters[question_id])
+        for loop, event in woken:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # The stream's event loop has already closed.
+
+    def snapshot(self, question_id):
+        """Return (version, {choice id: votes}) for a watched question."""
+        with self._lock:
+            return (self._versions[question_id],
+                    dict(self._counts[question_id]))
+
+    def _watch(self, question_id, load, waiter):
+        # The counts are loaded under the lock, so no change can be
+        # published between reading them and registering the question,
+        # and no watcher can leave in between either.
+        with self._lock:
+            if question_id not in self._counts:
+                counts, loaded = load()
+                counts = dict(counts)
+                self._counts[question_id] = counts
+                self._loaded[question_id] = loaded
+                self._versions[question_id] = 0
+                self._waiters[question_id] = set()
+                for choice_id in counts:
+                    self._questions[choice_id] = question_id
+            self._waiters[question_id].add(waiter)
+
+    async def updates(self, question_id, load, heartbeat=None):
+        """
+        Yield (version, counts) now and after every change. load() returns
+        the initial {choice id: votes} and the question's tally_version,
+        read together, when the question isn't watched yet; it runs in a
+        thread, so it may use the ORM. Changes that
+        arrive while the consumer is busy are coalesced into the next
+        snapshot. With a heartbeat (seconds) an unchanged snapshot is also
+        yielded after that long without changes.
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        await sync_to_async(self._watch)(question_id, load, waiter)
+        try:
+            while True:
+                yield self.snapshot(question_id)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+                waiter[1].clear()
+        finally:
+            with self._lock:
+                self._waiters[question_id].discard(waiter)
+                if not self._waiters[question_id]:
+                    for choice_id in self._counts.pop(question_id):
+                        self._questions.pop(choice_id, None)
+                    del self._versions[question_id]
+                    del self._loaded[question_id]
+                    del self._waiters[question_id]
+
+
+hub = TallyHub()
@@ -0,0 +1,247 @@
+"""
+Queue-based logging for the polls logger.
+
+QueueHandler is the only handler on the request path: it freezes the
+message and puts the record on a bounded queue, which takes about a
+microsecond. A background thread drains the queue in batches into the log
+file, flushed once per batch, and the console.
+
+The thread only runs in the server process, where mysite.wsgi and
+mysite.asgi call start(); management commands write their records
+synchronously. The file isn't rotated here, several worker processes
+would race to rename it: rotate it with logrotate or the like, without
+copytruncate, and each process reopens it when it sees it was moved.
+
+When the queue is full the 'drop' policy discards the new record at once,
+while 'block' waits up to block_timeout seconds for room before
+discarding it. Discarded records are counted in the
+polls_log_records_dropped_total metric and reported in the log by the
+next batch. The queue is drained when the handler is closed, which
+logging does at exit.
+"""
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import weakref
+
+from . import metrics
+
+FILE_FORMAT = '{levelname} {asctime} {module} {message}'
+CONSOLE_FORMAT = '{levelname} {message}'
+POLICIES = ('drop', 'block')
+
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None)))
+_RECORD_ATTRS |= {'message', 'asctime'}
+
+# Every open QueueHandler, for start().
+_handlers = weakref.WeakSet()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, extra= fields included."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class BatchFileHandler(logging.handlers.WatchedFileHandler):
+    """A WatchedFileHandler that flushes once per batch of records."""
+
+    _batching = False
+
+    def flush(self):
+        if not self._batching:
+            super().flush()
+
+    def handle_batch(self, records):
+        self._batching = True
+        try:
+            for record in records:
+                self.handle(record)
+        finally:
+            self._batching = False
+            self.flush()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """A QueueListener that hands its handlers every queued record at once."""
+
+    def __init__(self, queue, handlers, batch_size, on_batch=None):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+
+    def enqueue_sentinel(self):
+        # Wait for room, a full queue mustn't keep the thread from stopping.
+        self.queue.put(self._sentinel)
+
+    def _take(self):
+        batch = [self.dequeue(True)]
+        while len(batch) < self.batch_size and batch[-1] is not self._sentinel:
+            try:
+                batch.append(self.dequeue(False))
+            except queue.Empty:
+                break
+        return batch
+
+    def handle_batch(self, records):
+        if self.on_batch:
+            records = self.on_batch() + records
+        for handler in self.handlers:
+            wanted = [record for record in records
+                      if record.levelno >= handler.level]
+            if not wanted:
+                continue
+            if isinstance(handler, BatchFileHandler):
+                handler.handle_batch(wanted)
+            else:
+                for record in wanted:
+                    handler.handle(record)
+
+    def _monitor(self):
+        while True:
+            batch = self._take()
+            records = [record for record in batch
+                       if record is not self._sentinel]
+            if records:
+                try:
+                    self.handle_batch(records)
+                except Exception:
+                    pass  # Handlers report their own errors.
+            for _ in batch:
+                self.queue.task_done()
+            if len(records) < len(batch):
+                break
+
+
+class QueueHandler(logging.Handler):
+    """
+    Log through a bounded queue to a file and the console, see the module
+    docstring. Set console_level to None for no console. Until start() is
+    called, records are written synchronously.
+
+    Not a logging.handlers.QueueHandler: from Python 3.12 dictConfig()
+    expects those to be configured with a queue and listener of its own.
+    """
+
+    def __init__(self, filename, json=False, console_level='INFO',
+                 queue_size=10000, policy='drop', block_timeout=0.05,
+                 batch_size=500):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}.")
+        # The targets are created first so that logging closes them after
+        # this handler has drained the queue into them.
+        targets = [BatchFileHandler(filename, delay=True)]
+        targets[0].setFormatter(JsonFormatter() if json else
+                                logging.Formatter(FILE_FORMAT, style='{'))
+        if console_level:
+            console = logging.StreamHandler()
+            console.setLevel(console_level)
+            console.setFormatter(JsonFormatter() if json else
+                                 logging.Formatter(CONSOLE_FORMAT, style='{'))
+            targets.append(console)
+        super().__init__()
+        self.queue = queue.Queue(queue_size)
+        self.targets = targets
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._unreported = 0
+        self._dropped_lock = threading.Lock()
+        self.listener = BatchQueueListener(self.queue, targets, batch_size,
+                                           self._report_dropped)
+        self.started = False
+        _handlers.add(self)
+        # A forked worker needs a thread of its own to drain its queue.
+        handler = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: handler() and
+                            handler()._restart())
+
+    def start(self):
+        """Hand the records to the background thread from now on."""
+        if not self.started:
+            self.started = True
+            self.listener.start()
+
+    def _restart(self):
+        self.queue = self.listener.queue = queue.Queue(self.queue.maxsize)
+        self.listener._thread = None
+        if self.started:
+            self.listener.start()
+
+    def emit(self, record):
+        try:
+            record = self.prepare(record)
+            if self.started:
+                self.enqueue(record)
+                return
+            for target in self.targets:
+                if record.levelno >= target.level:
+                    target.handle(record)
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record):
+        # Only freeze the message, formatting is left to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        with self._dropped_lock:
+            self.dropped += 1
+            self._unreported += 1
+        metrics.LOG_RECORDS_DROPPED.inc()
+
+    def _report_dropped(self):
+        with self._dropped_lock:
+            dropped, self._unreported = self._unreported, 0
+        if not dropped:
+            return []
+        return [logging.LogRecord(
+            'polls', logging.WARNING, __file__, 0,
+            f"Dropped {dropped} log record(s), the log queue was full.",
+            None, None)]
+
+    def close(self):
+        _handlers.discard(self)
+        if self.listener._thread is not None:
+            self.listener.stop()
+        for target in self.targets:
+            target.close()
+        super().close()
+
+
+def start():
+    """Start the writer thread of every QueueHandler, in a server process."""
+    for handler in list(_handlers):
+        handler.start()
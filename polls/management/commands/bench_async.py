@@ -0,0 +1,118 @@
+import asyncio
+import json
+import random
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import AsyncClient
+from django.urls import reverse
+
+from polls import bench
+from polls.models import Choice, Question
+
+ENDPOINTS = ('index', 'results', 'vote')
+PATHS = {
+    'sync': {'index': 'polls:index', 'results': 'polls:results',
+             'vote': 'polls:vote'},
+    'async': {'index': 'polls:async_index', 'results': 'polls:async_results',
+              'vote': 'polls:async_vote'},
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare requests/sec and latency of the sync and async views "
+            "under concurrent load through the ASGI test client. The seeded "
+            "data is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help="Requests per endpoint and path.")
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--questions', type=int, default=50)
+        parser.add_argument('--votes', type=int, default=2000)
+        parser.add_argument('--json', action='store_true',
+                            help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            # The event loop runs the ORM calls back in this thread, so the
+            # requests see the seeded rows inside this transaction.
+            with transaction.atomic(), bench.allow_test_client():
+                bench.seed(options['questions'], options['votes'])
+                report = async_to_sync(self.run)(options)
+                raise bench.Rollback
+        except bench.Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{'endpoint':<10}{'path':<7}{'req/s':>10}"
+                          f"{'p50 ms':>10}{'p99 ms':>10}")
+        for row in report:
+            self.stdout.write(f"{row['endpoint']:<10}{row['path']:<7}"
+                              f"{row['rps']:>10.1f}{row['p50_ms']:>10.2f}"
+                              f"{row['p99_ms']:>10.2f}")
+
+    async def run(self, options):
+        open_questions = [pk async for pk in Question.objects.open(
+            ).values_list('pk', flat=True)]
+        if not open_questions:
+            raise CommandError("The seeded data has no open questions, "
+                               "seed more with --questions.")
+        choices = {}
+        async for pk, question_id in Choice.objects.filter(
+                question__in=open_questions).values_list('pk', 'question'):
+            choices.setdefault(question_id, []).append(pk)
+
+        clients = []
+        for n in range(options['concurrency']):
+            user = await User.objects.acreate(username=f"bench-async-{n}")
+            client = AsyncClient()
+            await client.aforce_login(user)
+            clients.append(client)
+
+        report = []
+        for endpoint in ENDPOINTS:
+            for path, names in PATHS.items():
+                rng = random.Random(0)
+
+                def request(client):
+                    question_id = rng.choice(open_questions)
+                    if endpoint == 'index':
+                        return client.get(reverse(names['index']))
+                    if endpoint == 'results':
+                        return client.get(reverse(names['results'],
+                                                  args=(question_id,)))
+                    return client.post(
+                        reverse(names['vote'], args=(question_id,)),
+                        {'choice': rng.choice(choices[question_id])})
+
+                report.append(await self.load(
+                    endpoint, path, clients, request, options['requests']))
+        return report
+
+    async def load(self, endpoint, path, clients, request, total):
+        latencies = []
+        remaining = total
+
+        async def worker(client):
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                await request(client)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for client in clients))
+        elapsed = time.perf_counter() - start
+        return {
+            'endpoint': endpoint, 'path': path, 'requests': total,
+            'rps': total / elapsed,
+            'p50_ms': bench.percentile(latencies, 50),
+            'p99_ms': bench.percentile(latencies, 99),
+        }
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from polls import bench, export
+from polls.models import Vote
+
+
+class Command(BaseCommand):
+    help = ("Seed growing numbers of votes and measure the throughput and "
+            "resident memory of the streaming vote export at each size, "
+            "against materializing the table. Linux only (reads "
+            "/proc/self/statm). Everything is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000,
+                            help="Votes at the largest size.")
+        parser.add_argument('--questions', type=int, default=1000)
+        parser.add_argument('--page-size', type=int,
+                            default=export.PAGE_SIZE)
+
+    def stream(self, fmt, page_size):
+        """Export every vote to nowhere, sampling RSS every page."""
+        start_rss = peak = bench.rss_mb()
+        start = time.perf_counter()
+        lines = 0
+        for lines, _ in enumerate(export.export('votes', fmt, page_size), 1):
+            if lines % page_size == 0:
+                peak = max(peak, bench.rss_mb())
+        elapsed = time.perf_counter() - start
+        rows = lines - 1 if fmt == 'csv' else lines  # Less the header.
+        return rows, elapsed, start_rss, max(peak, bench.rss_mb())
+
+    def materialize(self):
+        start_rss = bench.rss_mb()
+        start = time.perf_counter()
+        rows = list(Vote.objects.values_list(
+            'pk', 'user_id', 'user__username', 'question_id', 'choice_id',
+            'choice__choice_text'))
+        elapsed = time.perf_counter() - start
+        return len(rows), elapsed, start_rss, bench.rss_mb()
+
+    def report(self, label, rows, elapsed, start_rss, peak):
+        self.stdout.write(f"{label:<14}{rows:>10}{rows / elapsed:>12.0f}"
+                          f"{start_rss:>11.1f}{peak:>11.1f}"
+                          f"{peak - start_rss:>9.1f}")
+
+    def handle(self, *args, **options):
+        total = options['rows']
+        sizes = sorted({max(1, total // 100), max(1, total // 10), total})
+        self.stdout.write(f"{'export':<14}{'rows':>10}{'rows/s':>12}"
+                          f"{'RSS MB':>11}{'peak MB':>11}{'grew MB':>9}")
+        try:
+            with transaction.atomic():
+                seeded = 0
+                for size in sizes:
+                    bench.seed(options['questions'], size - seeded)
+                    seeded = size
+                    for fmt in sorted(export.FORMATS):
+                        self.report(f"stream {fmt}",
+                                    *self.stream(fmt, options['page_size']))
+                self.report("materialized", *self.materialize())
+                raise bench.Rollback
+        except bench.Rollback:
+            pass
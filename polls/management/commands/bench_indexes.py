@@ -0,0 +1,89 @@
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from polls import bench, pagination
+from polls.models import Choice, Question, Vote
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic data set and compare the query plans and "
+            "timings of the polls hot queries on the index layout from "
+            "before migration 0009 and on the current one. Everything is "
+            "rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=10000)
+        parser.add_argument('--votes', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def queries(self, user_id, question_id):
+        """The query shapes issued by polls/views.py."""
+        return {
+            'index': lambda: pagination.queryset('all'),
+            'open polls': lambda: Question.objects.open().values('pk')[:100],
+            'recent polls': lambda: Question.objects.recent().values('pk'),
+            'closed polls': lambda: Question.objects.closed().values(
+                'pk')[:100],
+            'previous vote': lambda: Vote.objects.filter(
+                user_id=user_id, question_id=question_id)[:1],
+            'results': lambda: Choice.objects.filter(
+                question_id=question_id).select_related('question'),
+        }
+
+    def explain(self, queryset, phase):
+        # The comment keeps SQLite from reusing a cached EXPLAIN statement
+        # prepared before the indexes were dropped.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} "
+                           f"{sql} /* {phase} */", params)
+            return "; ".join(str(row[-1]) for row in cursor.fetchall())
+
+    def measure(self, queries, repeat, phase):
+        return {
+            name: (self.explain(build(), phase),
+                   bench.timed(lambda: list(build()), repeat))
+            for name, build in queries.items()
+        }
+
+    def restore_baseline(self):
+        """
+        Put the indexes back as they were before migration 0009: no
+        Question index (0009 and 0011 added them all) and an index on the
+        Vote user foreign key, which 0009 dropped. The Vote indexes of
+        0007 and 0008 stay.
+        """
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for index in Question._meta.indexes:
+                cursor.execute(f"DROP INDEX {quote(index.name)}")
+            cursor.execute(
+                f"CREATE INDEX {quote('bench_vote_user_id')} ON "
+                f"{quote(Vote._meta.db_table)} "
+                f"({quote(Vote._meta.get_field('user').column)})")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.stdout.write(
+                    f"Seeding {options['questions']} questions and "
+                    f"{options['votes']} votes...")
+                user_ids, question_ids = bench.seed(
+                    options['questions'], options['votes'], skew=1.0)
+                queries = self.queries(user_ids[-1], question_ids[0])
+                current = self.measure(queries, options['repeat'], 'after')
+                self.restore_baseline()
+                baseline = self.measure(queries, options['repeat'], 'before')
+                raise bench.Rollback
+        except bench.Rollback:
+            pass
+
+        self.stdout.write("before: the indexes as of migration 0008; "
+                          "after: the current indexes")
+        for name in queries:
+            plan_before, ms_before = baseline[name]
+            plan_after, ms_after = current[name]
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  before: {ms_before:8.3f} ms  {plan_before}")
+            self.stdout.write(f"  after:  {ms_after:8.3f} ms  {plan_after}")
@@ -0,0 +1,85 @@
+import logging
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import bench, logs
+
+
+def slowed(handler, latency):
+    """Make each write of handler take at least latency seconds more."""
+    if latency:
+        emit = handler.emit
+
+        def slow_emit(record):
+            time.sleep(latency)
+            emit(record)
+
+        handler.emit = slow_emit
+    return handler
+
+
+class Command(BaseCommand):
+    help = ("Compare the cost of a log call on the request path with the "
+            "former synchronous FileHandler and with the queued handler of "
+            "polls.logs, writing to a scratch directory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=20000)
+        parser.add_argument('--disk-latency-ms', type=float, default=0.0,
+                            help="Extra time each write to disk takes, to "
+                                 "mimic a slow or busy disk.")
+        parser.add_argument('--queue-size', type=int, default=10000)
+        parser.add_argument('--policy', choices=logs.POLICIES,
+                            default='drop')
+
+    def run(self, handler, records):
+        """Log records messages, return the per-call microseconds and the
+        seconds taken to log them and to have them all written."""
+        logger = logging.getLogger('polls.bench_logging')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        samples = []
+        try:
+            start = time.perf_counter()
+            for n in range(records):
+                began = time.perf_counter()
+                logger.info("Vote submitted for poll #%s", n)
+                samples.append((time.perf_counter() - began) * 1e6)
+            logged = time.perf_counter() - start
+            handler.close()
+            written = time.perf_counter() - start
+        finally:
+            logger.removeHandler(handler)
+        return samples, logged, written
+
+    def report(self, label, samples, logged, written, dropped):
+        self.stdout.write(
+            f"{label:<8}{sum(samples) / len(samples):>10.1f}"
+            f"{bench.percentile(samples, 50):>10.1f}"
+            f"{bench.percentile(samples, 99):>10.1f}"
+            f"{max(samples):>12.1f}{logged:>11.2f}{written:>12.2f}"
+            f"{dropped:>9}")
+
+    def handle(self, *args, **options):
+        latency = options['disk_latency_ms'] / 1000
+        self.stdout.write(f"{'handler':<8}{'mean us':>10}{'p50 us':>10}"
+                          f"{'p99 us':>10}{'max us':>12}{'logged s':>11}"
+                          f"{'written s':>12}{'dropped':>9}")
+        with tempfile.TemporaryDirectory() as directory:
+            handler = slowed(logging.FileHandler(
+                os.path.join(directory, 'sync.log')), latency)
+            handler.setFormatter(logging.Formatter(logs.FILE_FORMAT,
+                                                   style='{'))
+            self.report('sync', *self.run(handler, options['records']), 0)
+
+            handler = logs.QueueHandler(
+                os.path.join(directory, 'queue.log'), console_level=None,
+                queue_size=options['queue_size'], policy=options['policy'])
+            handler.start()
+            slowed(handler.targets[0], latency)
+            self.report('queue', *self.run(handler, options['records']),
+                        handler.dropped)
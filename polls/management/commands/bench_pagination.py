@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from polls import bench, pagination
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    help = ("Seed a large poll catalog and compare the time to read an "
+            "index page at increasing depths with OFFSET and with the "
+            "keyset cursors of polls.pagination. Everything is rolled back "
+            "afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=1000000)
+        parser.add_argument('--filter', choices=sorted(pagination.FILTERS),
+                            default='all')
+        parser.add_argument('--pages', type=int, nargs='+',
+                            default=[1, 10, 100, 1000, 10000, 100000],
+                            help="Page numbers to read.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        name = options['filter']
+        size = pagination.PAGE_SIZE
+        questions = getattr(Question.objects, pagination.FILTERS[name])()
+        ordered = questions.order_by(*pagination.ordering(name))
+        try:
+            with transaction.atomic():
+                bench.seed(options['questions'], 0, choices=0)
+                total = questions.count()
+                self.stdout.write(f"{total} questions in '{name}', "
+                                  f"{size} a page")
+                self.stdout.write(f"{'page':>8}{'offset ms':>12}"
+                                  f"{'keyset ms':>12}")
+                for page in options['pages']:
+                    offset = (page - 1) * size
+                    if offset >= total:
+                        break
+                    position = None
+                    if offset:
+                        # Where the previous page's cursor would point.
+                        position = ordered.values_list(
+                            'pub_date', 'pk')[offset - 1]
+                    by_offset = bench.timed(
+                        lambda: list(ordered[offset:offset + size + 1]),
+                        options['repeat'])
+                    by_keyset = bench.timed(
+                        lambda: list(pagination.queryset(name, position)),
+                        options['repeat'])
+                    self.stdout.write(f"{page:>8}{by_offset:>12.3f}"
+                                      f"{by_keyset:>12.3f}")
+                raise bench.Rollback
+        except bench.Rollback:
+            pass
@@ -0,0 +1,128 @@
+import json
+import platform
+import random
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls import bench
+from polls.models import Choice, Question
+
+ENDPOINTS = ('index', 'detail', 'vote', 'results')
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic data set with skewed poll popularity, drive "
+            "the index, detail, vote and results views through the test "
+            "client and print throughput, latency percentiles and query "
+            "counts per endpoint as JSON. The seeded data is rolled back "
+            "afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=1000)
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--votes', type=int, default=50000)
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help="Zipf exponent of poll popularity.")
+        parser.add_argument('--requests', type=int, default=500,
+                            help="Requests per endpoint.")
+        parser.add_argument('--clients', type=int, default=20,
+                            help="Logged-in users issuing the requests.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="File to write, default stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), bench.allow_test_client():
+                user_ids, question_ids = bench.seed(
+                    options['questions'], options['votes'],
+                    choices=options['choices'], skew=options['skew'],
+                    rng=random.Random(options['seed']))
+                endpoints = self.run(options, user_ids, question_ids)
+                raise bench.Rollback
+        except bench.Rollback:
+            pass
+
+        report = {
+            'dataset': {key: options[key] for key in (
+                'questions', 'choices', 'votes', 'skew', 'seed')},
+            'requests_per_endpoint': options['requests'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'endpoints': endpoints,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as out:
+                out.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, options, user_ids, question_ids):
+        open_ids = set(Question.objects.open().filter(
+            pk__in=question_ids).values_list('pk', flat=True))
+        # Keep the seed's popularity order, so the busiest polls are
+        # requested most, as they were voted on most.
+        targets = [pk for pk in question_ids if pk in open_ids]
+        if not targets:
+            raise CommandError("The seeded data has no open questions, "
+                               "seed more with --questions.")
+        weights = [1 / (rank + 1) ** options['skew']
+                   for rank in range(len(targets))]
+        choices = {}
+        for pk, question_id in Choice.objects.filter(
+                question__in=targets).values_list('pk', 'question'):
+            choices.setdefault(question_id, []).append(pk)
+
+        clients = []
+        for user_id in user_ids[:options['clients']]:
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            clients.append(client)
+
+        rng = random.Random(options['seed'])
+
+        def request(endpoint, client):
+            question_id = rng.choices(targets, weights)[0]
+            if endpoint == 'index':
+                return client.get(reverse('polls:index'))
+            if endpoint == 'vote':
+                return client.post(
+                    reverse('polls:vote', args=(question_id,)),
+                    {'choice': rng.choice(choices[question_id])})
+            return client.get(reverse(f'polls:{endpoint}',
+                                      args=(question_id,)))
+
+        return {endpoint: self.load(endpoint, clients, request,
+                                    options['requests'])
+                for endpoint in ENDPOINTS}
+
+    def load(self, endpoint, clients, request, total):
+        latencies, queries, statuses = [], [], {}
+        start = time.perf_counter()
+        for n in range(total):
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                response = request(endpoint, clients[n % len(clients)])
+                latencies.append((time.perf_counter() - began) * 1000)
+            queries.append(len(captured))
+            status = str(response.status_code)
+            statuses[status] = statuses.get(status, 0) + 1
+        elapsed = time.perf_counter() - start
+        return {
+            'requests': total,
+            'rps': total / elapsed,
+            'p50_ms': bench.percentile(latencies, 50),
+            'p95_ms': bench.percentile(latencies, 95),
+            'p99_ms': bench.percentile(latencies, 99),
+            'queries_mean': sum(queries) / total,
+            'queries_max': max(queries),
+            'status': statuses,
+        }
@@ -0,0 +1,113 @@
+import copy
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+
+from polls import bench
+from polls.models import Choice, Question, Vote
+
+
+def connect(name, profile):
+    """
+    Point this process's default connection at the SQLite file name, with
+    the settings of DATABASE_PROFILES[profile]. Only for forked processes:
+    the connection inherited from the parent is dropped, not closed.
+    """
+    settings_dict = {**connections['default'].settings_dict, 'NAME': name,
+                     'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+                     'OPTIONS': {}}
+    settings_dict.update(copy.deepcopy(settings.DATABASE_PROFILES[profile]))
+    connections['default'] = type(connections['default'])(settings_dict)
+
+
+def prepare(name, questions, votes):
+    """Migrate and seed name, return the user ids and (question id, choice
+    id) pairs of the open polls."""
+    connect(name, 'basic')
+    call_command('migrate', verbosity=0, interactive=False)
+    user_ids, _ = bench.seed(questions, votes)
+    choices = list(Choice.objects.filter(
+        question__in=Question.objects.open()).values_list('question_id',
+                                                          'pk'))
+    connections['default'].close()
+    return user_ids, choices
+
+
+def work(name, profile, seconds, user_ids, choices, seed):
+    """
+    Act as one worker process serving vote requests for seconds: read the
+    poll's results, then cast a vote, with the connection handling of a
+    request. Return the latencies in ms and the number of requests that
+    failed with a database error.
+    """
+    connect(name, profile)
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        question_id, choice_id = rng.choice(choices)
+        start = time.perf_counter()
+        try:
+            Question.objects.get(pk=question_id)
+            list(Choice.objects.filter(question_id=question_id))
+            Vote.objects.cast(User(pk=rng.choice(user_ids)),
+                              Choice(pk=choice_id, question_id=question_id))
+        except OperationalError:
+            errors += 1
+        else:
+            latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            close_old_connections()
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = ("Measure vote throughput with several processes writing to one "
+            "SQLite file, under each DATABASE_PROFILES entry. Works on a "
+            "seeded copy in a scratch directory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--votes', type=int, default=2000)
+        parser.add_argument('--profiles', nargs='+',
+                            default=list(settings.DATABASE_PROFILES),
+                            choices=list(settings.DATABASE_PROFILES))
+
+    def handle(self, *args, **options):
+        # The workers inherit the loaded project, this needs fork.
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(f"{'profile':<12}{'req/s':>10}{'p50 ms':>10}"
+                          f"{'p99 ms':>10}{'errors':>8}")
+        with tempfile.TemporaryDirectory() as directory, \
+                context.Pool(options['workers']) as pool:
+            seeded = str(Path(directory) / 'seeded.sqlite3')
+            user_ids, choices = pool.apply(prepare, (
+                seeded, options['questions'], options['votes']))
+            if not choices:
+                raise CommandError("The seeded data has no open polls, seed "
+                                   "more with --questions.")
+            for profile in options['profiles']:
+                name = str(Path(directory) / f'{profile}.sqlite3')
+                shutil.copy(seeded, name)
+                results = pool.starmap(work, [
+                    (name, profile, options['seconds'], user_ids, choices, n)
+                    for n in range(options['workers'])])
+                latencies = [ms for worker, _ in results for ms in worker]
+                errors = sum(errors for _, errors in results)
+                self.stdout.write(
+                    f"{profile:<12}"
+                    f"{len(latencies) / options['seconds']:>10.1f}"
+                    f"{bench.percentile(latencies, 50):>10.2f}"
+                    f"{bench.percentile(latencies, 99):>10.2f}{errors:>8}")
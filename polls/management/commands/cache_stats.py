@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from polls import cache
+
+
+class Command(BaseCommand):
+    help = "Show the hit rate of the poll listing cache."
+
+    def handle(self, *args, **options):
+        stats = cache.stats()
+        self.stdout.write(f"hits: {stats['hits']}  misses: {stats['misses']}"
+                          f"  hit ratio: {stats['ratio']:.1%}")
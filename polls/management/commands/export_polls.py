@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from polls import export
+
+
+class Command(BaseCommand):
+    help = ("Stream the votes or the per-choice results as CSV or NDJSON, "
+            "reading the tables in fixed-size pages.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.DATASETS))
+        parser.add_argument('--format', choices=sorted(export.FORMATS),
+                            default='csv')
+        parser.add_argument('--output', help="File to write, default stdout.")
+        parser.add_argument('--page-size', type=int, default=export.PAGE_SIZE,
+                            help="Rows read per query.")
+
+    def handle(self, *args, **options):
+        lines = export.export(options['dataset'], options['format'],
+                              options['page_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as out:
+            out.writelines(lines)
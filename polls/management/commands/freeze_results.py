@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from polls import snapshots
+
+
+class Command(BaseCommand):
+    help = ("Freeze the results of every closed poll that has no snapshot "
+            "yet, so that no results request has to.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=snapshots.BATCH_SIZE,
+                            help="Polls frozen per query.")
+
+    def handle(self, *args, **options):
+        frozen = snapshots.sweep(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Froze the results of {frozen} closed poll(s)."))
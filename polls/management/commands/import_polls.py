@@ -0,0 +1,48 @@
+import contextlib
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import poll_import
+
+
+class Command(BaseCommand):
+    help = ("Create polls with their choices from a JSON or CSV file, a "
+            "batch at a time with bulk inserts, and report polls/s. See "
+            "polls.poll_import for the formats.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, - for stdin.")
+        parser.add_argument('--format', choices=poll_import.FORMATS,
+                            help="Defaults to the file's extension.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Polls per transaction.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if format not in poll_import.FORMATS:
+            raise CommandError(f"Cannot tell the format of {path}, pass "
+                               f"--format.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        polls = choices = 0
+        start = time.perf_counter()
+        try:
+            with (open(path, encoding='utf-8', newline='') if path != '-'
+                  else contextlib.nullcontext(sys.stdin)) as stream:
+                for created, batch_choices in poll_import.import_polls(
+                        stream, format, options['batch_size']):
+                    polls += created
+                    choices += batch_choices
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{polls} poll(s)...")
+        except (OSError, ValueError) as e:
+            raise CommandError(
+                f"Could not import {path} after {polls} poll(s): {e}")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {polls} poll(s) and {choices} choice(s) in "
+            f"{elapsed:.2f}s, {polls / max(elapsed, 1e-9):.0f} polls/s."))
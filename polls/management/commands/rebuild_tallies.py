@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from polls import tallies
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored vote tallies from the Vote table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_ids', nargs='*', type=int,
+                            help="Only rebuild these questions.")
+
+    def handle(self, *args, **options):
+        questions = options['question_ids'] or None
+        drifted = tallies.drifted_choices(questions).count()
+        tallies.rebuild(questions)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt tallies, {drifted} choice(s) had drifted."))
@@ -0,0 +1,260 @@
+"""
+Process-shared metrics in the Prometheus text format.
+
+Every process keeps its series in its own file under POLLS_METRICS_DIR,
+mapped into memory, so recording a value is a dictionary lookup and a
+write to memory. The metrics view reads every process's file and adds
+them up, which gives the totals of all the workers of a host however the
+load balancer spread the requests. Files of exited workers are kept, so
+counters don't go backwards when a worker is replaced; clear the
+directory when deploying.
+
+Each file is an 8-byte header holding the bytes used, followed by entries
+of a 4-byte key length, the key (the series as it appears in the text
+format, padded to 8 bytes) and its value as an 8-byte float.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_HEADER = struct.Struct('Q')
+_LENGTH = struct.Struct('I')
+_VALUE = struct.Struct('d')
+_INITIAL_SIZE = 1 << 16
+
+
+def _padded(offset):
+    return (offset + 7) & ~7
+
+
+def _entries(data):
+    """Yield (key, value, value offset) of the entries in a store file."""
+    used = _HEADER.unpack_from(data, 0)[0]
+    offset = _HEADER.size
+    while offset < used:
+        length = _LENGTH.unpack_from(data, offset)[0]
+        start = offset + _LENGTH.size
+        key = bytes(data[start:start + length]).decode()
+        offset = _padded(start + length)
+        yield key, _VALUE.unpack_from(data, offset)[0], offset
+        offset += _VALUE.size
+
+
+class _Store:
+    """The series of one process, in a memory-mapped file."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._offsets = {key: offset
+                         for key, _, offset in _entries(self._map)}
+
+    def _append(self, key):
+        encoded = key.encode()
+        start = self._used
+        offset = _padded(start + _LENGTH.size + len(encoded))
+        end = offset + _VALUE.size
+        if end > len(self._map):
+            size = len(self._map)
+            while size < end:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        _LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + _LENGTH.size:start + _LENGTH.size
+                  + len(encoded)] = encoded
+        _VALUE.pack_into(self._map, offset, 0.0)
+        # Publish the entry to readers only once it's complete.
+        self._used = end
+        _HEADER.pack_into(self._map, 0, end)
+        self._offsets[key] = offset
+        return offset
+
+    def add(self, key, amount):
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._append(key)
+            value = _VALUE.unpack_from(self._map, offset)[0]
+            _VALUE.pack_into(self._map, offset, value + amount)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _current_store():
+    """Return this process's store, or None when metrics are off."""
+    global _store
+    directory = settings.POLLS_METRICS_DIR
+    if not directory:
+        return None
+    path = Path(directory) / f"{os.getpid()}.db"
+    # A worker forked after the store was opened gets a file of its own.
+    if _store is None or _store[0] != path:
+        with _store_lock:
+            if _store is None or _store[0] != path:
+                Path(directory).mkdir(parents=True, exist_ok=True)
+                _store = (path, _Store(path))
+    return _store[1]
+
+
+def collect():
+    """Return {series: value} summed over every process's file."""
+    totals = {}
+    directory = settings.POLLS_METRICS_DIR
+    if not directory:
+        return totals
+    for path in Path(directory).glob('*.db'):
+        try:
+            data = path.read_bytes()
+        except OSError:
+            continue  # Removed while listing the directory.
+        for key, value, _ in _entries(data):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    pairs = ','.join(f'{key}="{_escape(value)}"'
+                     for key, value in sorted(labels.items()))
+    return f'{name}{{{pairs}}}'
+
+
+_registry = []
+
+
+class Counter:
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels "
+                             f"{self.labelnames}, not {tuple(labels)}.")
+        store = _current_store()
+        if store is not None:
+            store.add(_series(self.name, labels), amount)
+
+    def samples(self, values):
+        series = {key: value for key, value in values.items()
+                  if key == self.name or key.startswith(self.name + '{')}
+        if not self.labelnames:
+            series.setdefault(self.name, 0.0)
+        return sorted(series.items())
+
+
+class Histogram:
+
+    type = 'histogram'
+    BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0,
+               7.5, 10.0)
+
+    def __init__(self, name, documentation, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        _registry.append(self)
+
+    def _bucket(self, bound):
+        return _series(f'{self.name}_bucket', {'le': bound})
+
+    def observe(self, value):
+        store = _current_store()
+        if store is None:
+            return
+        for bound in self.buckets:
+            if value <= bound:
+                store.add(self._bucket(bound), 1)
+        store.add(self._bucket('+Inf'), 1)
+        store.add(f'{self.name}_sum', value)
+        store.add(f'{self.name}_count', 1)
+
+    def time(self):
+        """Decorate a function, sync or async, to observe its run time."""
+        def decorator(func):
+            if iscoroutinefunction(func):
+                @wraps(func)
+                async def inner(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.observe(time.perf_counter() - start)
+            else:
+                @wraps(func)
+                def inner(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return func(*args, **kwargs)
+                    finally:
+                        self.observe(time.perf_counter() - start)
+            return inner
+        return decorator
+
+    def samples(self, values):
+        keys = [self._bucket(bound) for bound in self.buckets]
+        keys += [self._bucket('+Inf'), f'{self.name}_sum',
+                 f'{self.name}_count']
+        return [(key, values.get(key, 0.0)) for key in keys]
+
+
+def exposition():
+    """Return every metric in the Prometheus text format."""
+    values = collect()
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(f'{key} {value!r}'
+                     for key, value in metric.samples(values))
+    return '\n'.join(lines) + '\n'
+
+
+VOTES_ACCEPTED = Counter(
+    'polls_votes_accepted_total', "Votes recorded or queued.")
+VOTES_REJECTED = Counter(
+    'polls_votes_rejected_total', "Votes refused, by reason.", ['reason'])
+VOTE_SECONDS = Histogram(
+    'polls_vote_seconds', "Time spent in the vote views.")
+LISTING_CACHE = Counter(
+    'polls_listing_cache_requests_total',
+    "Poll listing cache lookups, by result (hit or miss).", ['result'])
+REQUESTS = Counter(
+    'polls_requests_total', "Requests, by URL name.", ['endpoint'])
+DB_SECONDS = Counter(
+    'polls_db_seconds_total', "Time spent in SQL queries, by URL name.",
+    ['endpoint'])
+BUFFERED_VOTES_DROPPED = Counter(
+    'polls_buffered_votes_dropped_total',
+    "Queued votes that could not be written, even on their own.")
+LOG_RECORDS_DROPPED = Counter(
+    'polls_log_records_dropped_total',
+    "Log records discarded because the log queue was full.")
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_existing_votes(apps, schema_editor):
+    Choice = apps.get_model('polls', 'Choice')
+    Question = apps.get_model('polls', 'Question')
+    Vote = apps.get_model('polls', 'Vote')
+    votes = (Vote.objects.filter(choice=OuterRef('pk'))
+             .order_by().values('choice')
+             .annotate(n=Count('pk')).values('n'))
+    Choice.objects.update(vote_count=Coalesce(Subquery(votes), 0))
+    counts = (Choice.objects.filter(question=OuterRef('pk'))
+              .order_by().values('question')
+              .annotate(n=Sum('vote_count')).values('n'))
+    Question.objects.update(vote_total=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_alter_question_pub_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='vote_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_votes, migrations.RunPython.noop),
+    ]
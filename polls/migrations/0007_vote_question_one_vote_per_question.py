@@ -0,0 +1,87 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def backfill_question(apps, schema_editor):
+    """Copy choice.question onto each vote, one pk range per transaction."""
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    last_id = Vote.objects.aggregate(last=Max('pk'))['last'] or 0
+    question = Choice.objects.filter(pk=OuterRef('choice_id')).values(
+        'question_id')
+    for start in range(0, last_id, BATCH_SIZE):
+        with transaction.atomic():
+            Vote.objects.filter(
+                pk__gt=start, pk__lte=start + BATCH_SIZE,
+                question__isnull=True,
+            ).update(question_id=Subquery(question))
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """
+    Keep only the latest vote of each user on each question: delete, one
+    pk range per transaction, the votes followed by a later one of the
+    same user on the same question, then recount the questions they
+    were on.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Question = apps.get_model('polls', 'Question')
+    Vote = apps.get_model('polls', 'Vote')
+    last_id = Vote.objects.aggregate(last=Max('pk'))['last'] or 0
+    later = Vote.objects.filter(user_id=OuterRef('user_id'),
+                                question_id=OuterRef('question_id'),
+                                pk__gt=OuterRef('pk'))
+    votes = (Vote.objects.filter(choice=OuterRef('pk'))
+             .order_by().values('choice')
+             .annotate(n=Count('pk')).values('n'))
+    counts = (Choice.objects.filter(question=OuterRef('pk'))
+              .order_by().values('question')
+              .annotate(n=Sum('vote_count')).values('n'))
+    for start in range(0, last_id, BATCH_SIZE):
+        with transaction.atomic():
+            superseded = Vote.objects.filter(
+                Exists(later), pk__gt=start, pk__lte=start + BATCH_SIZE)
+            question_ids = set(superseded.values_list('question_id',
+                                                      flat=True))
+            if not question_ids:
+                continue
+            # Nothing refers to a vote, so this is a single DELETE.
+            superseded.delete()
+            # Historical models have no signals, recount these questions.
+            Choice.objects.filter(question__in=question_ids).update(
+                vote_count=Coalesce(Subquery(votes), 0))
+            Question.objects.filter(pk__in=question_ids).update(
+                vote_total=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so a large Vote table is never held
+    # in one long transaction.
+    atomic = False
+
+    dependencies = [
+        ('polls', '0006_choice_vote_count_question_vote_total'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.RunPython(backfill_question, migrations.RunPython.noop),
+        migrations.RunPython(remove_duplicate_votes,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='one_vote_per_question'),
+        ),
+    ]
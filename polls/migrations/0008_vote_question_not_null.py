@@ -0,0 +1,87 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def recount(apps, choice_ids):
+    Choice = apps.get_model('polls', 'Choice')
+    Question = apps.get_model('polls', 'Question')
+    Vote = apps.get_model('polls', 'Vote')
+    choices = Choice.objects.filter(pk__in=choice_ids)
+    question_ids = set(choices.values_list('question_id', flat=True))
+    votes = (Vote.objects.filter(choice=OuterRef('pk'))
+             .order_by().values('choice')
+             .annotate(n=Count('pk')).values('n'))
+    choices.update(vote_count=Coalesce(Subquery(votes), 0))
+    counts = (Choice.objects.filter(question=OuterRef('pk'))
+              .order_by().values('question')
+              .annotate(n=Sum('vote_count')).values('n'))
+    Question.objects.filter(pk__in=question_ids).update(
+        vote_total=Coalesce(Subquery(counts), 0))
+
+
+def backfill_question(apps, schema_editor):
+    """
+    Fill in the question of votes written without one since 0007 (raw
+    fixture loads, workers still running the old code), one pk range per
+    transaction. The latest vote of a user on a question wins.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    last_id = Vote.objects.aggregate(last=Max('pk'))['last'] or 0
+    question = Choice.objects.filter(pk=OuterRef('choice_id')).values(
+        'question_id')
+    for start in range(0, last_id, BATCH_SIZE):
+        with transaction.atomic():
+            pending = Vote.objects.filter(
+                pk__gt=start, pk__lte=start + BATCH_SIZE,
+                question__isnull=True)
+            rows = list(pending.values_list('user_id',
+                                            'choice__question_id'))
+            if not rows:
+                continue
+            related = Vote.objects.filter(
+                user_id__in={user_id for user_id, _ in rows},
+                choice__question_id__in={q for _, q in rows},
+            ).order_by('pk').values_list('pk', 'user_id',
+                                         'choice__question_id', 'choice_id')
+            latest = {}
+            for pk, user_id, question_id, _ in related:
+                latest[(user_id, question_id)] = pk
+            stale = {pk: choice_id
+                     for pk, user_id, question_id, choice_id in related
+                     if latest[(user_id, question_id)] != pk}
+            if stale:
+                Vote.objects.filter(pk__in=stale).delete()
+                recount(apps, set(stale.values()))
+            pending.update(question_id=Subquery(question))
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so a large Vote table is never held
+    # in one long transaction.
+    atomic = False
+
+    dependencies = [
+        ('polls', '0007_vote_question_one_vote_per_question'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_question, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['question', 'user'], name='vote_question_user_idx'),
+        ),
+    ]
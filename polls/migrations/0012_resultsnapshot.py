@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_question_pub_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultSnapshot',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='polls.question')),
+                ('counts', models.JSONField()),
+                ('total', models.PositiveIntegerField()),
+                ('frozen_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0012_resultsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='tally_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
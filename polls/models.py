@@ -3,17 +3,103 @@ Poll's Question and Choice model.
 Question has a question and a publication date.
 A Choice has two fields: the text of the choice and a vote tally.
 Each Choice is associated with a Question.
+The tallies are materialized on Choice and Question (see polls.tallies).
+A closed poll's final results are frozen into a ResultSnapshot.
 """
 import datetime
-from django.db import models
+from types import SimpleNamespace
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+def _open_at(now):
+    """The SQL side of Question.can_vote() at the time now."""
+    return (models.Q(pub_date__lte=now)
+            & (models.Q(end_date__isnull=True) | models.Q(end_date__gte=now)))
+
+
+class QuestionQuerySet(models.QuerySet):
+    """
+    The publication and voting checks of Question as SQL predicates, so
+    that the database picks the rows (through question_pub_end_idx)
+    rather than Python testing each fetched question.
+    """
+
+    def published(self):
+        """Questions whose publication date has passed."""
+        return self.filter(pub_date__lte=timezone.now())
+
+    def upcoming(self):
+        """Questions scheduled to be published."""
+        return self.filter(pub_date__gt=timezone.now())
+
+    def open(self):
+        """Questions open for voting, those can_vote() is true of."""
+        return self.filter(_open_at(timezone.now()))
+
+    def closed(self):
+        """Published questions whose voting has ended."""
+        now = timezone.now()
+        return self.filter(pub_date__lte=now, end_date__lt=now)
+
+    def recent(self):
+        """Questions published within the last day."""
+        now = timezone.now()
+        return self.filter(pub_date__gte=now - datetime.timedelta(days=1),
+                           pub_date__lte=now)
+
+    def create_polls(self, polls):
+        """
+        Create polls, (unsaved Question, choice texts) pairs, with one bulk
+        insert of the questions and one of the choices in one transaction,
+        and return the questions. Bulk inserts send no signals, so the
+        cached listings are dropped here, once the transaction commits.
+        """
+        from . import cache
+
+        polls = list(polls)
+        with transaction.atomic():
+            questions = self.bulk_create(
+                [question for question, _ in polls])
+            Choice.objects.bulk_create(
+                Choice(question=question, choice_text=text)
+                for question, texts in polls for text in texts)
+            transaction.on_commit(cache.bump, using=self.db)
+        return questions
+
+    def with_voting_open(self):
+        """Annotate each question with voting_open, can_vote() computed
+        by the database."""
+        return self.annotate(voting_open=models.ExpressionWrapper(
+            _open_at(timezone.now()), output_field=models.BooleanField()))
+
+
 class Question(models.Model):
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published', default=timezone.now)
     end_date = models.DateTimeField('ending date',null=True)
-    
+    vote_total = models.PositiveIntegerField(default=0, editable=False)
+    # Changes whenever the question, its choices or its votes change.
+    modified = models.DateTimeField(auto_now=True)
+    # Counts the committed tally changes, in commit order, see polls.live.
+    tally_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # The index page and the open-for-voting checks range-scan
+            # pub_date and then test end_date from the same index.
+            models.Index(fields=['pub_date', 'end_date'],
+                         name='question_pub_end_idx'),
+            # The index pages walk (pub_date, id) from a cursor, see
+            # polls.pagination.
+            models.Index(fields=['pub_date', 'id'],
+                         name='question_pub_id_idx'),
+            # Closed polls are found by end_date, most questions have none.
+            models.Index(fields=['end_date'], name='question_end_idx',
+                         condition=models.Q(end_date__isnull=False)),
+        ]
 
     def __str__(self):
         return self.question_text
@@ -32,22 +118,173 @@ class Question(models.Model):
             return self.pub_date<= now 
         return self.pub_date<= now <=self.end_date
 
+    def is_closed(self):
+        """Whether voting has ended, for good: closed() in Python."""
+        now = timezone.now()
+        return (self.end_date is not None
+                and self.pub_date <= now and self.end_date < now)
+
 class Choice(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
+    vote_count = models.PositiveIntegerField(default=0, editable=False)
 
     @property
     def votes(self):
         """Return the number of votes for this choice."""
-        return len(Vote.objects.filter(choice=self))
+        return self.vote_count
 
     def __str__(self):
         return self.choice_text
     
+class ResultSnapshot(models.Model):
+    """
+    The final results of a closed poll, frozen by polls.snapshots once
+    its end_date has passed and never changed afterwards.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE,
+                                    primary_key=True, related_name='snapshot')
+    # [[choice id, choice text, votes], ...] in choice order.
+    counts = models.JSONField()
+    total = models.PositiveIntegerField()
+    frozen_at = models.DateTimeField(default=timezone.now)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("A result snapshot cannot be changed.")
+        super().save(*args, **kwargs)
+
+    def choices(self):
+        """Return the frozen choices, with the attributes of a Choice the
+        results page reads."""
+        return [SimpleNamespace(id=pk, pk=pk, choice_text=text, votes=votes)
+                for pk, text, votes in self.counts]
+
+    def __str__(self):
+        return f"Results of {self.question_id}: {self.total} vote(s)"
+
+
+class VoteManager(models.Manager):
+
+    def cast(self, user, choice):
+        """
+        Record the user's vote for choice, changing their existing vote on
+        the question in place if they already voted.
+        Return the vote and the previously chosen Choice (None if new).
+        """
+        question_id = choice.question_id
+        with transaction.atomic():
+            vote = (self.select_for_update().select_related('choice')
+                    .filter(user=user, question_id=question_id).first())
+            if vote is None:
+                try:
+                    with transaction.atomic():
+                        return self.create(user=user, choice=choice,
+                                           question_id=question_id), None
+                except IntegrityError:
+                    # A concurrent request voted first, change that vote.
+                    vote = self.select_related('choice').get(
+                        user=user, question_id=question_id)
+            previous = vote.choice
+            if previous != choice:
+                vote.choice = choice
+                vote.save(update_fields=['choice'])
+            return vote, previous
+
+
+    def cast_many(self, votes):
+        """
+        Record many (user_id, choice) votes with set-based queries in one
+        transaction, keeping one vote per user per question; the last vote
+        of a user on a question wins. The tallies are adjusted directly
+        since bulk writes send no signals.
+        Return {(user_id, question_id): previous choice id or None}.
+        """
+        from . import tallies
+
+        wanted = {}
+        for user_id, choice in votes:
+            wanted[(user_id, choice.question_id)] = choice.pk
+        for attempt in range(3):
+            try:
+                with transaction.atomic():
+                    return self._cast_many(wanted, tallies)
+            except IntegrityError:
+                # Another process inserted one of these votes first,
+                # the retry will see it and change it instead.
+                if attempt == 2:
+                    raise
+
+    def _cast_many(self, wanted, tallies):
+        existing = {
+            (vote.user_id, vote.question_id): vote
+            for vote in self.filter(
+                user_id__in={user_id for user_id, _ in wanted},
+                question_id__in={question_id for _, question_id in wanted})
+            if (vote.user_id, vote.question_id) in wanted
+        }
+        created, changed, previous = [], [], {}
+        choice_deltas, question_deltas = {}, {}
+        for (user_id, question_id), choice_id in wanted.items():
+            vote = existing.get((user_id, question_id))
+            previous[(user_id, question_id)] = vote and vote.choice_id
+            if vote is None:
+                created.append(self.model(user_id=user_id, choice_id=choice_id,
+                                          question_id=question_id))
+                question_deltas[question_id] = (
+                    question_deltas.get(question_id, 0) + 1)
+            elif vote.choice_id != choice_id:
+                choice_deltas[vote.choice_id] = (
+                    choice_deltas.get(vote.choice_id, 0) - 1)
+                vote.choice_id = choice_id
+                changed.append(vote)
+                question_deltas.setdefault(question_id, 0)
+            else:
+                continue
+            choice_deltas[choice_id] = choice_deltas.get(choice_id, 0) + 1
+        self.bulk_create(created)
+        self.bulk_update(changed, ['choice'])
+        tallies.apply(choice_deltas, question_deltas)
+        return previous
+
+
 class Vote(models.Model):
     """Record a choice for a question made by a user."""
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Lookups by user are served by the (user, question) unique index.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    # Denormalized from choice so lookups and tallies per question skip
+    # the join, and one vote per question is enforced by the database.
+    # The (question, user) index below covers the foreign key index.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE,
+                                 db_index=False)
+
+    objects = VoteManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='one_vote_per_question'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'user'],
+                         name='vote_question_user_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        vote = super().from_db(db, field_names, values)
+        # Remember the stored choice so a changed vote can move its tally.
+        vote._stored_choice_id = vote.__dict__.get('choice_id')
+        return vote
+
+    def save(self, *args, **kwargs):
+        if self.question_id is None:
+            self.question_id = self.choice.question_id
+        # The tally receivers run from post_save, so keep them in the
+        # same transaction as the insert.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self) -> str:
-        return f"{self.user.username} voted for {self.choice.choice_text}"
\ No newline at end of file
+        return f"{self.user.username} voted for {self.choice.choice_text}"
@@ -0,0 +1,101 @@
+"""
+Keyset pagination of the poll index.
+
+Questions are listed newest first, ordered by (pub_date, id). A page
+after the first starts from a cursor, the (pub_date, id) of the last
+question on the previous page, and is read with
+
+    WHERE pub_date <= :pub_date AND (pub_date < :pub_date OR id < :id)
+    ORDER BY pub_date DESC, id DESC LIMIT n
+
+which the (pub_date, id) index answers as one range scan from the cursor,
+however deep the page: unlike OFFSET, no skipped row is ever read. The
+upcoming polls are listed the other way, soonest first, with the
+comparisons reversed. The cursor is signed, so clients can only hand back
+the ones they were given.
+"""
+import datetime
+
+from django.core import signing
+from django.db.models import Q
+from django.http import Http404
+
+from .models import Question
+
+PAGE_SIZE = 5
+SALT = 'polls.pagination'
+
+# ?filter= value: the Question.objects method selecting the questions.
+FILTERS = {
+    'all': 'published',
+    'open': 'open',
+    'closed': 'closed',
+    'upcoming': 'upcoming',
+}
+# Filters listed oldest first, the others are listed newest first.
+ASCENDING = {'upcoming'}
+
+
+def ordering(name):
+    """Return the order_by() fields of the filter name."""
+    if name in ASCENDING:
+        return ('pub_date', 'pk')
+    return ('-pub_date', '-pk')
+
+
+def encode(question):
+    """Return the opaque cursor for the page after question."""
+    return signing.dumps([question.pub_date.isoformat(), question.pk],
+                         salt=SALT, compress=True)
+
+
+def decode(cursor):
+    """Return the (pub_date, id) of cursor, raise Http404 if invalid."""
+    try:
+        pub_date, pk = signing.loads(cursor, salt=SALT)
+        return datetime.datetime.fromisoformat(pub_date), int(pk)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise Http404("Invalid page.")
+
+
+def queryset(name, position=None, size=PAGE_SIZE, questions=None):
+    """
+    Return one page of the questions of filter name, after the decoded
+    cursor position, plus one more question telling if a page follows.
+    questions narrows down the columns or adds prefetches, it has to
+    load pub_date.
+    """
+    if name not in FILTERS:
+        raise Http404("Unknown filter.")
+    if questions is None:
+        questions = Question.objects.all()
+    ascending = name in ASCENDING
+    if position is not None:
+        pub_date, pk = position
+        # Before the filter's own pub_date bound: SQLite starts the range
+        # scan at the first bound in the WHERE clause, and from now rather
+        # than from the cursor it would read every row in between.
+        if ascending:
+            questions = questions.filter(
+                Q(pub_date__gt=pub_date) | Q(pk__gt=pk),
+                pub_date__gte=pub_date)
+        else:
+            questions = questions.filter(
+                Q(pub_date__lt=pub_date) | Q(pk__lt=pk),
+                pub_date__lte=pub_date)
+    questions = getattr(questions, FILTERS[name])()
+    return questions.order_by(*ordering(name))[:size + 1]
+
+
+def split(rows, size=PAGE_SIZE):
+    """Return the page of rows and the cursor of the next page, or None."""
+    if len(rows) > size:
+        return rows[:size], encode(rows[size - 1])
+    return rows, None
+
+
+def from_request(request):
+    """Return the filter name and decoded cursor of the request's query."""
+    name = request.GET.get('filter', 'all')
+    cursor = request.GET.get('cursor')
+    return name, decode(cursor) if cursor else None
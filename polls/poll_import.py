@@ -0,0 +1,117 @@
+"""
+Bulk creation of polls read from a JSON or CSV stream.
+
+A JSON file is an array of polls, read one at a time by
+polls.fixtures.iter_objects:
+
+    [{"question_text": "...", "pub_date": "2024-01-01T00:00:00Z",
+      "end_date": null, "choices": ["Yes", "No"]}, ...]
+
+A CSV file has a header row naming question_text, optionally pub_date
+and end_date, and any other columns, whose non-empty cells are the
+choices in column order. Dates are ISO 8601, naive ones are in the
+current time zone, and pub_date defaults to now.
+
+Polls are created a batch at a time by Question.objects.create_polls(),
+each batch in one transaction with two inserts.
+"""
+import csv
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import fixtures
+from .models import Question
+
+FORMATS = ('json', 'csv')
+DATE_FIELDS = ('pub_date', 'end_date')
+MAX_LENGTH = Question._meta.get_field('question_text').max_length
+
+
+def _date(value, name, number):
+    if value in (None, ''):
+        return None
+    try:
+        date = parse_datetime(value)
+    except (TypeError, ValueError):
+        date = None
+    if date is None:
+        raise ValueError(f"Poll {number}: {name} {value!r} is not an ISO "
+                         f"8601 date and time.")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _text(value, name, number):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"Poll {number}: {name} must be a non-empty string.")
+    if len(value) > MAX_LENGTH:
+        raise ValueError(f"Poll {number}: {name} is longer than "
+                         f"{MAX_LENGTH} characters.")
+    return value
+
+
+def to_poll(record, number):
+    """
+    Return the (unsaved Question, choice texts) of the poll record, a
+    dictionary, raise ValueError naming the poll's number if invalid.
+    """
+    pub_date = _date(record.get('pub_date'), 'pub_date', number)
+    end_date = _date(record.get('end_date'), 'end_date', number)
+    if pub_date is None:
+        pub_date = timezone.now()
+    if end_date is not None and end_date < pub_date:
+        raise ValueError(f"Poll {number}: end_date is before pub_date.")
+    choices = record.get('choices', [])
+    if not isinstance(choices, list):
+        raise ValueError(f"Poll {number}: choices must be a list.")
+    question = Question(
+        question_text=_text(record.get('question_text'), 'question_text',
+                            number),
+        pub_date=pub_date, end_date=end_date)
+    return question, [_text(choice, 'a choice', number)
+                      for choice in choices]
+
+
+def read_json(stream):
+    """Yield the poll records of a JSON array."""
+    return fixtures.iter_objects(stream)
+
+
+def read_csv(stream):
+    """Yield the poll records of a CSV file with a header row."""
+    rows = csv.reader(stream)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [name.strip() for name in header]
+    if 'question_text' not in header:
+        raise ValueError("The CSV header has no question_text column.")
+    fields = {name: header.index(name)
+              for name in ('question_text', *DATE_FIELDS) if name in header}
+    choices = [i for i, name in enumerate(header)
+               if name not in fields]
+    for row in rows:
+        if not any(row):
+            continue
+        row += [''] * (len(header) - len(row))
+        record = {name: row[i] for name, i in fields.items()}
+        record['choices'] = [row[i] for i in choices if row[i].strip()]
+        yield record
+
+
+READERS = {'json': read_json, 'csv': read_csv}
+
+
+def import_polls(stream, format, batch_size):
+    """
+    Create the polls of stream, batch_size at a time. Yield the number of
+    polls and of choices in each batch as it is committed.
+    """
+    records = READERS[format](stream)
+    polls = (to_poll(record, number)
+             for number, record in enumerate(records, 1))
+    for batch in fixtures.batched(polls, batch_size):
+        Question.objects.create_polls(batch)
+        yield len(batch), sum(len(choices) for _, choices in batch)
@@ -0,0 +1,171 @@
+"""
+Per-request profiling.
+
+ProfilingMiddleware times a sample of the requests, the share set by
+POLLS_PROFILE_SAMPLE_RATE: the number and time of SQL queries, the time
+spent rendering the response's template and the total time in the view
+stack. The figures go to the polls logger as one structured line and,
+with POLLS_PROFILE_HEADER, to the client as a Server-Timing header, which
+browser developer tools display; leave that off in production, it tells
+any client how the database is doing. With metrics on, every request
+also adds its SQL time to polls.metrics.
+
+Template time is that of rendering a TemplateResponse, as the generic
+views return, and includes any query run while rendering, so the two can
+overlap. Views that render() their template themselves count it in the
+total only.
+
+The current profile lives in a context variable, which sync_to_async
+carries into the thread running the async ORM. The query hook is
+installed on every connection as it opens (polls.apps loads this module
+before any does) and does nothing outside a profiled request.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+logger = logging.getLogger('polls')
+
+_current = ContextVar('polls_profile', default=None)
+
+
+class Profile:
+
+    def __init__(self, sampled=True):
+        self.sampled = sampled
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.start = time.perf_counter()
+
+    def timings(self):
+        """Return {name: milliseconds} of the request so far."""
+        return {
+            'db': self.db * 1000,
+            'template': self.template * 1000,
+            'total': (time.perf_counter() - self.start) * 1000,
+        }
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db += time.perf_counter() - start
+        profile.queries += 1
+
+
+@receiver(connection_created)
+def hook_connection(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _sampled():
+    rate = settings.POLLS_PROFILE_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def _start():
+    """Return the request's Profile if it's sampled or metrics are on."""
+    sampled = _sampled()
+    if sampled or settings.POLLS_METRICS_DIR:
+        return Profile(sampled)
+    return None
+
+
+def _finish(request, response, profile):
+    if settings.POLLS_METRICS_DIR:
+        match = request.resolver_match
+        endpoint = match.view_name if match else 'unmatched'
+        metrics.REQUESTS.inc(endpoint=endpoint)
+        metrics.DB_SECONDS.inc(profile.db, endpoint=endpoint)
+    if not profile.sampled:
+        return response
+    timings = profile.timings()
+    if settings.POLLS_PROFILE_HEADER:
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={timings["db"]:.1f};desc="{profile.queries} queries"',
+            f'template;dur={timings["template"]:.1f}',
+            f'total;dur={timings["total"]:.1f}',
+        ])
+    fields = {
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'queries': profile.queries,
+        'db_ms': round(timings['db'], 2),
+        'template_ms': round(timings['template'], 2),
+        'total_ms': round(timings['total'], 2),
+    }
+    logger.info("profile " + " ".join(f"{key}={value}"
+                                      for key, value in fields.items()),
+                extra={'profile': fields})
+    return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of the requests. A class, unlike the other polls
+    middleware, because Django only calls process_template_response on
+    middleware instances.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        profile = _start()
+        if profile is None:
+            return self.get_response(request)
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, profile)
+
+    async def _acall(self, request):
+        profile = _start()
+        if profile is None:
+            return await self.get_response(request)
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, profile)
+
+    def process_template_response(self, request, response):
+        """
+        Time the rendering of a TemplateResponse. As the first middleware,
+        this hook runs last, right before the handler renders the response,
+        and the post-render callback runs right after.
+        """
+        profile = _current.get()
+        if profile is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                profile.template += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,110 @@
+"""
+Read replica routing.
+
+Views decorated with reads_from_replica (the index, the results and the
+exports) read the polls tables from the database alias named by
+POLLS_REPLICA_DATABASE. Every other query, and the users and sessions
+even in those views, goes to the primary ('default'). Leave the setting
+empty to read everything from the primary.
+
+A replica lags behind the primary, so a user who has just voted would
+see results without their vote. replica_middleware therefore pins a
+browser to the primary for POLLS_REPLICA_STICKY_SECONDS after any
+request that can write (POST and the like) with a cookie, and pinned
+requests read from the primary too.
+
+The replica gets its schema from the primary along with the rows, so the
+router never lets migrations run on it.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'polls_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_reads = ContextVar('polls_replica_reads', default=None)
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary, and polls reads to the replica where a
+    view asked for it."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'polls':
+            return _reads.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == settings.POLLS_REPLICA_DATABASE:
+            return False
+        return None
+
+
+def _replica_for(request):
+    """Return the alias request may read from, None for the primary."""
+    if PIN_COOKIE in request.COOKIES:
+        return None
+    return settings.POLLS_REPLICA_DATABASE or None
+
+
+def reads_from_replica(view):
+    """Decorate a view, sync or async, to run its reads on the replica."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            token = _reads.set(_replica_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _reads.reset(token)
+    else:
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            token = _reads.set(_replica_for(request))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _reads.reset(token)
+    return inner
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, even in a replica view."""
+    token = _reads.set(None)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+def _pin(request, response):
+    if settings.POLLS_REPLICA_DATABASE and request.method not in SAFE_METHODS:
+        response.set_cookie(PIN_COOKIE, '1',
+                            max_age=settings.POLLS_REPLICA_STICKY_SECONDS,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return _pin(request, await get_response(request))
+    else:
+        def middleware(request):
+            return _pin(request, get_response(request))
+    return middleware
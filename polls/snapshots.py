@@ -0,0 +1,99 @@
+"""
+Frozen results of closed polls.
+
+Once a question's end_date has passed its tallies are final, so they are
+copied once into a ResultSnapshot, a single row holding every choice's
+count. The results pages then read that row instead of the question's
+choices. A snapshot is written the first time the results of a closed
+poll are shown, or ahead of time by ``python manage.py freeze_results``.
+
+A vote accepted just before end_date may not be written yet: its
+transaction may still be open, or it may wait in a vote buffer. So a poll
+is only frozen POLLS_SNAPSHOT_GRACE_SECONDS after it closed, and this
+process's buffer is flushed first; until then its results are read live.
+
+The counts are read from the primary database, never from a replica that
+may not have caught up with the last votes. A question reopened by moving
+its end_date loses its snapshot and is frozen again when it next closes.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import router
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import fixtures
+from .buffer import get_buffer
+from .models import Choice, Question, ResultSnapshot
+
+BATCH_SIZE = 500
+
+
+def _closed_before():
+    """Questions closed before this time can be frozen."""
+    return timezone.now() - datetime.timedelta(
+        seconds=settings.POLLS_SNAPSHOT_GRACE_SECONDS)
+
+
+def freezable(question):
+    """Whether the results of question can be frozen now."""
+    return question.is_closed() and question.end_date < _closed_before()
+
+
+def _flush_votes():
+    vote_buffer = get_buffer()
+    if vote_buffer is not None:
+        vote_buffer.flush()
+
+
+def _freeze(question_ids):
+    """Snapshot the results of the closed questions question_ids and return
+    the stored snapshots by question id. A question already frozen keeps
+    its snapshot."""
+    using = router.db_for_write(ResultSnapshot)
+    counts = {pk: [] for pk in question_ids}
+    for question_id, pk, text, votes in (
+            Choice.objects.using(using)
+            .filter(question_id__in=question_ids).order_by('pk')
+            .values_list('question_id', 'pk', 'choice_text', 'vote_count')):
+        counts[question_id].append([pk, text, votes])
+    snapshots = {
+        pk: ResultSnapshot(question_id=pk, counts=rows,
+                           total=sum(votes for _, _, votes in rows))
+        for pk, rows in counts.items()}
+    # A concurrent request may freeze the same question, the first wins,
+    # so the rows are read back rather than returned as built.
+    ResultSnapshot.objects.using(using).bulk_create(
+        snapshots.values(), ignore_conflicts=True)
+    return ResultSnapshot.objects.using(using).in_bulk(question_ids)
+
+
+def freeze(question):
+    """Snapshot and return the results of a freezable question."""
+    _flush_votes()
+    snapshot = _freeze([question.pk])[question.pk]
+    snapshot.question = question
+    return snapshot
+
+
+def sweep(batch_size=BATCH_SIZE):
+    """Freeze every freezable question without a snapshot, batch_size at a
+    time. Return the number of questions frozen."""
+    _flush_votes()
+    using = router.db_for_write(ResultSnapshot)
+    pending = list(Question.objects.using(using).closed().filter(
+        end_date__lt=_closed_before(), snapshot__isnull=True
+    ).values_list('pk', flat=True))
+    frozen = 0
+    for batch in fixtures.batched(pending, batch_size):
+        frozen += len(_freeze(batch))
+    return frozen
+
+
+@receiver(post_save, sender=Question)
+def thaw(sender, instance, created, **kwargs):
+    """Drop the snapshot of a question saved as no longer closed."""
+    if not created and not instance.is_closed():
+        ResultSnapshot.objects.filter(question_id=instance.pk).delete()
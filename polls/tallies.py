@@ -0,0 +1,115 @@
+"""
+Materialized vote tallies.
+
+Choice.vote_count and Question.vote_total are kept in step with the Vote
+table by the receivers below, inside the same transaction as the Vote
+insert or delete. Anything that bypasses model signals (bulk_create,
+queryset.update, raw SQL) must call apply() itself, or run rebuild()
+afterwards via ``python manage.py rebuild_tallies``.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import live
+from .models import Choice, Question, Vote
+
+
+def apply(choice_deltas, question_deltas):
+    """
+    Add the given deltas, keyed by primary key, to the stored tallies.
+    Every question listed is marked modified, even with a zero delta, and
+    gets a new tally_version. The choice deltas reach the live results
+    streams once committed, with the versions of their questions.
+    """
+    for delta, choice_ids in _by_delta(choice_deltas).items():
+        if delta:
+            Choice.objects.filter(pk__in=choice_ids).update(
+                vote_count=F('vote_count') + delta)
+    now = timezone.now()
+    for delta, question_ids in _by_delta(question_deltas).items():
+        Question.objects.filter(pk__in=question_ids).update(
+            vote_total=F('vote_total') + delta, modified=now,
+            tally_version=F('tally_version') + 1)
+    if any(choice_deltas.values()):
+        # The update holds the row until the commit, so the versions
+        # read back number the commits in order.
+        versions = dict(Question.objects.filter(
+            pk__in=question_deltas).values_list('pk', 'tally_version'))
+        transaction.on_commit(partial(live.hub.publish, dict(choice_deltas),
+                                      versions))
+
+
+def _by_delta(deltas):
+    """Group the keys of {pk: delta} by delta, one UPDATE per group: a
+    batch of votes mostly adds 1 everywhere."""
+    groups = {}
+    for pk, delta in deltas.items():
+        groups.setdefault(delta, []).append(pk)
+    return groups
+
+
+def _record(vote, delta):
+    apply({vote.choice_id: delta}, {vote.question_id: delta})
+    # Keep a loaded choice coherent for callers that read choice.votes
+    # right after voting.
+    if Vote.choice.is_cached(vote):
+        vote.choice.vote_count += delta
+
+
+@receiver(post_save, sender=Vote)
+def count_vote(sender, instance, created, **kwargs):
+    if created:
+        _record(instance, 1)
+    else:
+        stored = getattr(instance, '_stored_choice_id', instance.choice_id)
+        if stored != instance.choice_id:
+            # The vote was changed in place, move it between choices.
+            apply({stored: -1, instance.choice_id: 1},
+                  {instance.question_id: 0})
+    instance._stored_choice_id = instance.choice_id
+
+
+@receiver(post_delete, sender=Vote)
+def uncount_vote(sender, instance, **kwargs):
+    _record(instance, -1)
+
+
+def drifted_choices(questions=None):
+    """Return the choices whose stored tally disagrees with the Vote table."""
+    choices = Choice.objects.all()
+    if questions is not None:
+        choices = choices.filter(question__in=questions)
+    return choices.annotate(actual=Count('vote')).exclude(
+        vote_count=F('actual'))
+
+
+def rebuild(questions=None):
+    """
+    Recompute every tally from the Vote table in two UPDATE statements.
+    The questions are marked modified, so conditional GETs see the new
+    counts.
+
+    Pass ``questions`` (a queryset or list of ids) to limit the rebuild.
+    """
+    choices = Choice.objects.all()
+    totals = Question.objects.all()
+    if questions is not None:
+        choices = choices.filter(question__in=questions)
+        totals = totals.filter(pk__in=questions)
+
+    votes = (Vote.objects.filter(choice=OuterRef('pk'))
+             .order_by().values('choice')
+             .annotate(n=Count('pk')).values('n'))
+    choices.update(vote_count=Coalesce(Subquery(votes), 0))
+
+    counts = (Choice.objects.filter(question=OuterRef('pk'))
+              .order_by().values('question')
+              .annotate(n=Sum('vote_count')).values('n'))
+    totals.update(vote_total=Coalesce(Subquery(counts), 0),
+                  modified=timezone.now())
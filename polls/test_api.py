@@ -0,0 +1,95 @@
+"""Tests of the read-only JSON API."""
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import api
+from polls.models import Choice, Question
+
+
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.questions = []
+        for n in range(7):
+            question = Question.objects.create(
+                question_text=f"Question {n}",
+                pub_date=now - datetime.timedelta(days=n + 1))
+            for c in range(3):
+                Choice.objects.create(question=question,
+                                      choice_text=f"Choice {c}")
+            cls.questions.append(question)
+        Choice.objects.filter(question=cls.questions[0]).update(vote_count=2)
+        cls.upcoming = Question.objects.create(
+            question_text="Upcoming", pub_date=now + datetime.timedelta(days=1))
+
+    def get(self, name, args=(), data=None, status=200):
+        response = self.client.get(reverse(f'polls:{name}', args=args), data)
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()
+
+    def test_list_pages(self):
+        first = self.get('api_list')
+        self.assertEqual([q['id'] for q in first['questions']],
+                         [q.pk for q in self.questions[:5]])
+        self.assertEqual(set(first['questions'][0]), set(api.LIST_FIELDS))
+        second = self.get('api_list', data={'cursor': first['next']})
+        self.assertEqual([q['id'] for q in second['questions']],
+                         [q.pk for q in self.questions[5:]])
+        self.assertIsNone(second['next'])
+
+    def test_detail(self):
+        question = self.questions[0]
+        data = self.get('api_detail', args=(question.pk,))
+        self.assertEqual(set(data), set(api.QUESTION_FIELDS))
+        self.assertIs(data['voting_open'], True)
+        self.assertEqual(len(data['choices']), 3)
+        self.get('api_detail', args=(self.upcoming.pk,), status=404)
+
+    def test_results(self):
+        data = self.get('api_results', args=(self.questions[0].pk,))
+        self.assertEqual(set(data), {'id', 'vote_total', 'choices'})
+        self.assertEqual([choice['votes'] for choice in data['choices']],
+                         [2, 2, 2])
+
+    def test_sparse_fieldset(self):
+        """Only the requested fields are sent, and only their columns
+        read."""
+        with self.assertNumQueries(1) as captured:
+            data = self.get('api_detail', args=(self.questions[1].pk,),
+                            data={'fields': 'id,question_text'})
+        self.assertEqual(data, {'id': self.questions[1].pk,
+                                'question_text': "Question 1"})
+        self.assertNotIn('vote_total', captured.captured_queries[0]['sql'])
+
+    def test_unknown_field(self):
+        data = self.get('api_list', data={'fields': 'id,secret'}, status=400)
+        self.assertIn("secret", data['error'])
+
+    def test_batch_is_two_queries(self):
+        ids = [q.pk for q in reversed(self.questions)] + [self.upcoming.pk]
+        with self.assertNumQueries(2):
+            data = self.get('api_batch',
+                            data={'ids': ','.join(map(str, ids))})
+        self.assertEqual([q['id'] for q in data['questions']], ids[:-1])
+        self.assertEqual(data['missing'], [self.upcoming.pk])
+        self.assertTrue(all(len(q['choices']) == 3
+                            for q in data['questions']))
+
+    def test_batch_errors(self):
+        self.get('api_batch', status=400)
+        self.get('api_batch', data={'ids': '1,two'}, status=400)
+        for pk in (0, -5, api.MAX_ID + 1, 10**23):
+            data = self.get('api_batch', data={'ids': f'1,{pk}'}, status=400)
+            self.assertIn("between 1 and", data['error'])
+        self.get('api_batch', data={'ids': ','.join(
+            str(n) for n in range(api.MAX_BATCH + 1))}, status=400)
+
+    def test_read_only(self):
+        response = self.client.post(reverse('polls:api_list'))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,77 @@
+"""Tests of the async index, results and vote views."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='voter',
+                                             password='12345')
+        self.question = Question.objects.create(
+            question_text="Async question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First")
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second")
+
+    async def test_index(self):
+        """The async index lists published questions."""
+        response = await self.async_client.get(reverse('polls:async_index'))
+        self.assertContains(response, "Async question")
+
+    async def test_results(self):
+        """The async results page shows tallies and answers 304."""
+        await Vote.objects.acreate(user=self.user, choice=self.first,
+                                   question=self.question)
+        url = reverse('polls:async_results', args=(self.question.id,))
+        response = await self.async_client.get(url)
+        self.assertEqual(response.context['total_votes'], 1)
+        self.assertContains(response, "100.0%")
+        response = await self.async_client.get(
+            url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_results_missing_question(self):
+        response = await self.async_client.get(
+            reverse('polls:async_results', args=(9999,)))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_vote_requires_login(self):
+        url = reverse('polls:async_vote', args=(self.question.id,))
+        response = await self.async_client.post(url,
+                                                {'choice': self.first.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(await Vote.objects.aexists())
+
+    async def test_vote_and_change(self):
+        """Voting twice through the async view changes the vote."""
+        await self.async_client.aforce_login(self.user)
+        url = reverse('polls:async_vote', args=(self.question.id,))
+        response = await self.async_client.post(url,
+                                                 {'choice': self.first.id})
+        self.assertRedirects(response, reverse('polls:async_results',
+                                               args=(self.question.id,)),
+                             fetch_redirect_response=False)
+        await self.async_client.post(url, {'choice': self.second.id})
+        vote = await Vote.objects.aget()
+        self.assertEqual(vote.choice_id, self.second.id)
+
+    async def test_vote_form(self):
+        """GET shows the form with the user's previous vote."""
+        await self.async_client.aforce_login(self.user)
+        await Vote.objects.acreate(user=self.user, choice=self.second,
+                                   question=self.question)
+        response = await self.async_client.get(
+            reverse('polls:async_vote', args=(self.question.id,)))
+        self.assertEqual(response.context['user_vote'].choice, self.second)
+        self.assertContains(response, "Second")
@@ -0,0 +1,88 @@
+"""Smoke tests of the benchmark commands on a tiny data set."""
+import json
+import os
+import runpy
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase
+
+import mysite.settings
+
+from polls.models import Question, Vote
+
+
+class BenchCommandTests(TestCase):
+
+    def test_bench_indexes(self):
+        """bench_indexes prints both plans and rolls its data back."""
+        out = StringIO()
+        call_command('bench_indexes', questions=20, votes=50, repeat=1,
+                     stdout=out)
+        self.assertIn("indexes as of migration 0008", out.getvalue())
+        self.assertIn("USING INDEX question_pub_id_idx", out.getvalue())
+        self.assertIn("SCAN polls_question", out.getvalue())
+        self.assertFalse(Question.objects.exists())
+        self.assertFalse(Vote.objects.exists())
+
+    def test_bench_async(self):
+        """bench_async reports every endpoint on both paths."""
+        out = StringIO()
+        call_command('bench_async', requests=4, concurrency=2, questions=20,
+                     votes=10, json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(len(report), 6)
+        self.assertEqual({row['path'] for row in report}, {'sync', 'async'})
+        self.assertFalse(Question.objects.exists())
+
+    def test_bench_export(self):
+        """bench_export reports every size and rolls its data back."""
+        out = StringIO()
+        call_command('bench_export', rows=100, questions=5, page_size=10,
+                     stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertTrue(lines[-1].startswith("materialized"))
+        self.assertFalse(Vote.objects.exists())
+
+    def test_bench_polls(self):
+        """bench_polls reports every endpoint as JSON and rolls back."""
+        out = StringIO()
+        call_command('bench_polls', questions=20, votes=40, requests=4,
+                     clients=2, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['endpoints']),
+                         {'index', 'detail', 'vote', 'results'})
+        for row in report['endpoints'].values():
+            self.assertEqual(sum(row['status'].values()), 4)
+            self.assertGreater(row['queries_max'], 0)
+        self.assertEqual(report['endpoints']['vote']['status'], {'302': 4})
+        self.assertFalse(Question.objects.exists())
+
+    def test_bench_logging(self):
+        """bench_logging reports both handlers."""
+        out = StringIO()
+        call_command('bench_logging', records=50, disk_latency_ms=0.1,
+                     stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]],
+                         ['sync', 'queue'])
+
+    def test_bench_sqlite(self):
+        """bench_sqlite reports each profile on its own scratch file."""
+        out = StringIO()
+        call_command('bench_sqlite', workers=2, seconds=0.2, questions=10,
+                     votes=20, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]],
+                         ['basic', 'production'])
+        self.assertFalse(Question.objects.exists())
+
+    def test_unknown_database_profile(self):
+        """A misspelt DATABASE_PROFILE names the profiles to choose from."""
+        with mock.patch.dict(os.environ, DATABASE_PROFILE='prod'), \
+                self.assertRaisesMessage(ImproperlyConfigured,
+                                         "choose one of: basic, production"):
+            runpy.run_path(mysite.settings.__file__)
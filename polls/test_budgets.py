@@ -0,0 +1,193 @@
+"""
+Performance budgets for every polls URL.
+
+Each view is requested once, cold (empty listing cache), against the same
+seeded data set, and must stay within the number of queries and the wall
+time listed in BUDGETS. A view over budget fails with the SQL it ran.
+Raise a budget only together with the change that needs it.
+"""
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from polls import bench
+from polls.models import Choice, Question
+
+# URL name, or name:method for requests other than GET:
+# (most queries, most milliseconds)
+BUDGETS = {
+    'index': (4, 300),
+    'create': (2, 300),
+    'create:post': (6, 300),
+    'detail': (5, 300),
+    'results': (2, 300),
+    'results_stream': (2, 300),
+    'vote': (5, 300),
+    'vote:post': (15, 300),
+    'vote_batch:post': (11, 300),
+    'export': (3, 500),
+    'async_index': (4, 300),
+    'async_results': (4, 300),
+    'async_vote': (5, 300),
+    'async_vote:post': (16, 300),
+    'api_list': (1, 300),
+    'api_batch': (2, 300),
+    'api_detail': (2, 300),
+    'api_results': (2, 300),
+    'login': (0, 300),
+    'metrics': (0, 300),
+    'logout:post': (4, 300),
+}
+
+
+class BudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        bench.seed(40, 400, rng=random.Random(0))
+        now = timezone.now()
+        # The busiest open poll, so the results count real votes.
+        cls.question = Question.objects.filter(
+            pub_date__lte=now, end_date__isnull=True).order_by(
+                '-vote_total').first()
+        cls.choice = Choice.objects.filter(question=cls.question).first()
+        cls.user = User.objects.create_user(username='budget',
+                                            is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, name, captured, elapsed_ms):
+        queries, ms = BUDGETS[name]
+        sql = "\n".join(f"  {n}. {query['sql']}"
+                        for n, query in enumerate(captured, 1))
+        self.assertLessEqual(
+            len(captured), queries,
+            f"{name} ran {len(captured)} queries, its budget is "
+            f"{queries}:\n{sql}")
+        self.assertLessEqual(
+            elapsed_ms, ms,
+            f"{name} took {elapsed_ms:.0f} ms, its budget is {ms} ms. "
+            f"It ran:\n{sql}")
+
+    def request(self, name, method='get', args=(), data=None, status=200,
+                **extra):
+        url = reverse(f'polls:{name}', args=args)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(url, data, **extra)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if response.streaming:
+                b''.join(response.streaming_content)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+        self.assertEqual(response.status_code, status)
+        self.assertWithinBudget(
+            name if method == 'get' else f'{name}:{method}',
+            captured, elapsed_ms)
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in
+                 get_resolver('polls.urls').url_patterns}
+        self.assertEqual(names, {name.split(':')[0] for name in BUDGETS})
+
+    def test_index(self):
+        self.request('index')
+
+    def test_create(self):
+        self.request('create')
+        self.request('create', 'post', data={
+            'question_text': "Budget poll", 'choice_set-TOTAL_FORMS': 3,
+            'choice_set-0-choice_text': "A", 'choice_set-1-choice_text': "B",
+            'choice_set-2-choice_text': "C"}, status=302)
+
+    def test_detail(self):
+        self.request('detail', args=(self.question.pk,))
+
+    def test_results(self):
+        self.request('results', args=(self.question.pk,))
+
+    def test_vote(self):
+        self.request('vote', args=(self.question.pk,))
+        self.request('vote', 'post', args=(self.question.pk,),
+                     data={'choice': self.choice.pk}, status=302)
+
+    def test_vote_batch(self):
+        """A batch voting on ten polls at once."""
+        votes = {}
+        for choice in Choice.objects.filter(
+                question__in=Question.objects.open()).order_by('pk'):
+            votes.setdefault(choice.question_id, choice.pk)
+        self.request('vote_batch', 'post', data={'votes': [
+            {'question': question_id, 'choice': choice_id}
+            for question_id, choice_id in list(votes.items())[:10]]},
+            content_type='application/json')
+
+    def test_export(self):
+        self.request('export', args=('votes', 'csv'))
+
+    def test_async_index(self):
+        self.request('async_index')
+
+    def test_async_results(self):
+        self.request('async_results', args=(self.question.pk,))
+
+    def test_async_vote(self):
+        self.request('async_vote', args=(self.question.pk,))
+        self.request('async_vote', 'post', args=(self.question.pk,),
+                     data={'choice': self.choice.pk}, status=302)
+
+    def test_api_list(self):
+        self.request('api_list')
+
+    def test_api_batch(self):
+        """The whole catalog in one batch costs what one question does."""
+        ids = ','.join(str(pk) for pk in Question.objects.values_list(
+            'pk', flat=True))
+        self.request('api_batch', data={'ids': ids})
+
+    def test_api_detail(self):
+        self.request('api_detail', args=(self.question.pk,))
+
+    def test_api_results(self):
+        self.request('api_results', args=(self.question.pk,))
+
+    def test_login(self):
+        self.client.logout()
+        self.request('login')
+
+    def test_logout(self):
+        self.request('logout', 'post', status=302)
+
+    async def test_results_stream(self):
+        """The stream's cost is what it takes to send the first event."""
+        url = reverse('polls:results_stream', args=(self.question.pk,))
+        # The capture has to run where the async ORM runs its queries, on
+        # the main thread's connection.
+        captured = CaptureQueriesContext(connection)
+        await sync_to_async(captured.__enter__)()
+        start = time.perf_counter()
+        response = await self.async_client.get(url)
+        events = aiter(response.streaming_content)
+        await anext(events)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        def leave():
+            captured.__exit__(None, None, None)
+            return captured.captured_queries
+
+        queries = await sync_to_async(leave)()
+        await events.aclose()
+        self.assertWithinBudget('results_stream', queries, elapsed_ms)
+
+    @override_settings(POLLS_METRICS_TOKEN='budget')
+    def test_metrics(self):
+        self.request('metrics', HTTP_AUTHORIZATION='Bearer budget')
@@ -0,0 +1,116 @@
+"""Tests of the write-behind vote buffer."""
+import datetime
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import buffer, metrics
+from polls.buffer import VoteBuffer
+from polls.models import Choice, Question, Vote
+
+BUFFERED = {'ENABLED': True, 'FLUSH_INTERVAL_MS': 10, 'MAX_BATCH': 2,
+            'MAX_QUEUE': 1, 'BLOCK_MS': 10}
+
+
+class VoteBufferTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='voter')
+        self.question = Question.objects.create(
+            question_text="Buffered question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First")
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second")
+
+    def test_flush_writes_queued_votes(self):
+        """Queued votes are written in one batch, the latest winning."""
+        vote_buffer = VoteBuffer(max_queue=10)
+        # Not started, so nothing is written until the flush.
+        self.assertTrue(vote_buffer.submit(self.user.pk, self.first))
+        self.assertTrue(vote_buffer.submit(self.user.pk, self.second))
+        self.assertFalse(Vote.objects.exists())
+        vote_buffer.flush()
+        self.assertEqual(Vote.objects.get().choice, self.second)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.vote_total, 1)
+
+    def test_bad_vote_spares_the_batch(self):
+        """A vote that fails alone is dropped, the rest are written."""
+        other = User.objects.create_user(username='other')
+        gone = Choice.objects.create(question=self.question,
+                                     choice_text="Deleted")
+        vote_buffer = VoteBuffer(max_queue=10)
+        vote_buffer.submit(self.user.pk, self.first)
+        vote_buffer.submit(other.pk, gone)
+        gone.delete()
+        with mock.patch.object(metrics.BUFFERED_VOTES_DROPPED,
+                               'inc') as dropped, \
+                self.assertLogs('polls', 'ERROR'):
+            vote_buffer.flush()
+        self.assertEqual(Vote.objects.get().choice, self.first)
+        dropped.assert_called_once_with()
+
+    def test_full_queue_is_refused(self):
+        vote_buffer = VoteBuffer(max_queue=1)
+        self.assertTrue(vote_buffer.submit(self.user.pk, self.first))
+        self.assertFalse(vote_buffer.submit(self.user.pk, self.second))
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(buffer.get_buffer())
+
+    @override_settings(POLLS_VOTE_BUFFER=BUFFERED)
+    def test_vote_view_refuses_when_queue_stays_full(self):
+        """A vote the buffer can't take isn't written ahead of the queued
+        one, which would then overwrite it."""
+        vote_buffer = VoteBuffer(max_queue=1, block_timeout=0.01)
+        vote_buffer.submit(self.user.pk, self.first)
+        self.addCleanup(setattr, buffer, '_buffer', None)
+        buffer._buffer = vote_buffer
+        self.client.force_login(self.user)
+        for name in ('polls:vote', 'polls:async_vote'):
+            response = self.client.post(
+                reverse(name, args=(self.question.pk,)),
+                {'choice': self.second.pk})
+            self.assertContains(response, "please try again", status_code=503)
+        self.assertFalse(Vote.objects.exists())
+        vote_buffer.flush()
+        self.assertEqual(Vote.objects.get().choice, self.first)
+
+    def test_blocked_submit_takes_freed_room(self):
+        vote_buffer = VoteBuffer(max_queue=1, block_timeout=5)
+        vote_buffer.submit(self.user.pk, self.first)
+        threading.Timer(0.05, vote_buffer._take, (0,)).start()
+        self.assertTrue(vote_buffer.submit(self.user.pk, self.second,
+                                           block=True))
+
+
+class VoteBufferThreadTests(TransactionTestCase):
+
+    def test_thread_flushes_and_stop_drains(self):
+        user = User.objects.create_user(username='voter')
+        question = Question.objects.create(
+            question_text="Buffered question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        choice = Choice.objects.create(question=question, choice_text="Yes")
+        vote_buffer = VoteBuffer(flush_interval=0.01)
+        # Wait for the flush rather than poll, the in-memory test database
+        # locks tables against concurrent readers.
+        written = threading.Event()
+        write = vote_buffer._write
+        vote_buffer._write = lambda batch: (write(batch), written.set())
+        vote_buffer.start()
+        self.addCleanup(vote_buffer.stop)
+        vote_buffer.submit(user.pk, choice)
+        self.assertTrue(written.wait(5))
+        self.assertTrue(Vote.objects.exists())
+
+        other = User.objects.create_user(username='other')
+        vote_buffer.submit(other.pk, choice)
+        vote_buffer.stop()
+        self.assertEqual(Vote.objects.count(), 2)
@@ -0,0 +1,87 @@
+"""Tests of the poll listing cache."""
+import datetime
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import cache as listing_cache
+from polls.models import Question
+
+
+def use_shared_cache(test):
+    """For the rest of test, cache in a throwaway file cache, which is
+    shared between processes like a production cache."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    settings = override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': directory.name}})
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+class ListingCacheTests(TestCase):
+
+    def setUp(self):
+        use_shared_cache(self)
+        self.question = Question.objects.create(
+            question_text="Cached question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+
+    def test_hit_after_miss(self):
+        """The second index request is served without a query."""
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:index'))
+        self.assertEqual(response.context['latest_question_list'],
+                         [self.question])
+        self.assertEqual(listing_cache.stats(),
+                         {'hits': 1, 'misses': 1, 'ratio': 0.5})
+
+    def test_saving_question_invalidates(self):
+        """Editing or deleting a question refreshes the listing."""
+        self.client.get(reverse('polls:index'))
+        self.question.question_text = "Edited question"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.save()
+        self.assertContains(self.client.get(reverse('polls:index')),
+                            "Edited question")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.delete()
+        self.assertContains(self.client.get(reverse('polls:index')),
+                            "No polls are available.")
+
+    def test_expires_when_next_question_is_published(self):
+        """The listing expires when a scheduled question goes live."""
+        Question.objects.create(
+            question_text="Scheduled",
+            pub_date=timezone.now() + datetime.timedelta(seconds=30))
+        with mock.patch.object(cache, 'set') as cache_set:
+            listing_cache.listing('index', list)
+        timeout = cache_set.call_args.args[2]
+        self.assertLessEqual(timeout, 31)
+        self.assertGreater(timeout, 0)
+
+    def test_bumped_after_commit(self):
+        """A listing built before the commit isn't cached as current."""
+        self.client.get(reverse('polls:index'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.question.question_text = "Edited question"
+            self.question.save()
+            before = listing_cache.version()
+        self.assertEqual(listing_cache.version(), before)
+        callbacks[0]()
+        self.assertNotEqual(listing_cache.version(), before)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_not_used(self):
+        """Under LocMemCache every request builds the listing."""
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('polls:index'))
+        self.assertEqual(listing_cache.stats()['hits'], 0)
@@ -0,0 +1,81 @@
+"""Tests of the streaming fixture import."""
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from polls.fixtures import iter_objects
+from polls.models import Choice, Question, Vote
+
+FIXTURES = ['data/polls-v4.json', 'data/votes-v4.json', 'data/users.json']
+
+
+class IterObjectsTests(TestCase):
+
+    def test_objects_split_across_reads(self):
+        """Objects are parsed whole however the reads split them."""
+        text = '[ {"a": [1, 2]},\n{"b": "]}"} ,{"c": {}} ]'
+        self.assertEqual(list(iter_objects(StringIO(text), read_size=3)),
+                         [{'a': [1, 2]}, {'b': ']}'}, {'c': {}}])
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_objects(StringIO(' [ ] '))), [])
+
+    def test_truncated_fixture(self):
+        with self.assertRaises(ValueError):
+            list(iter_objects(StringIO('[{"a": 1}, {"b"'), read_size=4))
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_objects(StringIO('{"a": 1}')))
+
+
+class ImportFixturesTests(TestCase):
+
+    def test_import_sample_data(self):
+        """The sample data loads with one vote per question and tallies."""
+        call_command('import_fixtures', *FIXTURES, batch_size=3,
+                     transaction_size=5, stdout=StringIO())
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 6)
+        votes = Vote.objects.count()
+        self.assertEqual(votes, Vote.objects.values(
+            'user', 'question').distinct().count())
+        self.assertEqual(sum(choice.votes for choice in Choice.objects.all()),
+                         votes)
+
+    def test_import_is_repeatable(self):
+        """Importing the same data twice changes nothing."""
+        call_command('import_fixtures', *FIXTURES, stdout=StringIO())
+        before = list(Vote.objects.values_list('user', 'question', 'choice'))
+        call_command('import_fixtures', *FIXTURES, stdout=StringIO())
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertCountEqual(
+            Vote.objects.values_list('user', 'question', 'choice'), before)
+
+    def test_later_vote_wins(self):
+        """A later vote of a user on a question replaces the earlier one."""
+        call_command('import_fixtures', *FIXTURES, stdout=StringIO())
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as votes:
+            # Older fixtures have neither the question nor one vote per
+            # user and question: user 2 votes for choice 21, then 20.
+            json.dump([{'model': 'polls.vote', 'pk': 100 + n,
+                        'fields': {'user': 2, 'choice': choice}}
+                       for n, choice in enumerate([21, 20])], votes)
+            votes.flush()
+            call_command('import_fixtures', votes.name, stdout=StringIO())
+        vote = Vote.objects.get(user=2, choice__in=[20, 21])
+        self.assertEqual(vote.choice_id, 20)
+
+    def test_vote_for_missing_choice(self):
+        """A vote without a question whose choice doesn't exist."""
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as votes:
+            json.dump([{'model': 'polls.vote', 'pk': 1,
+                        'fields': {'user': 2, 'choice': 21}}], votes)
+            votes.flush()
+            with self.assertRaises(CommandError):
+                call_command('import_fixtures', votes.name, stdout=StringIO())
@@ -0,0 +1,116 @@
+"""Tests of the live results stream."""
+import asyncio
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.live import TallyHub
+from polls.models import Choice, Question, Vote
+
+
+class TallyHubTests(TestCase):
+
+    async def test_bursts_are_coalesced(self):
+        """Changes made while a stream is busy arrive as one snapshot."""
+        hub = TallyHub()
+        updates = hub.updates(1, lambda: ({10: 0, 11: 0}, 0))
+        self.assertEqual(await anext(updates), (0, {10: 0, 11: 0}))
+        for version in range(1, 6):
+            hub.publish({10: 1}, {1: version})
+        hub.publish({11: 1, 99: 1}, {1: 6, 2: 1})
+        self.assertEqual(await anext(updates), (6, {10: 5, 11: 1}))
+        await updates.aclose()
+        self.assertFalse(hub.watching(1))
+
+    async def test_heartbeat(self):
+        """Without changes the snapshot is repeated after the heartbeat."""
+        hub = TallyHub()
+        updates = hub.updates(1, lambda: ({10: 3}, 0), heartbeat=0.01)
+        first = await anext(updates)
+        self.assertEqual(await anext(updates), first)
+        await updates.aclose()
+
+    async def test_counts_loaded_once(self):
+        """Only the first watcher loads the counts, later ones share them
+        with the changes published since."""
+        hub = TallyHub()
+        first = hub.updates(1, lambda: ({10: 2}, 0))
+        await anext(first)
+        hub.publish({10: 1}, {1: 1})
+        second = hub.updates(1, lambda: self.fail("Loaded twice"))
+        self.assertEqual(await anext(second), (1, {10: 3}))
+        await first.aclose()
+        await second.aclose()
+        self.assertFalse(hub.watching(1))
+
+    async def test_changes_in_loaded_counts_are_skipped(self):
+        """A change committed before the counts were read, but published
+        after, isn't counted twice."""
+        hub = TallyHub()
+        updates = hub.updates(1, lambda: ({10: 4}, 7))
+        await anext(updates)
+        hub.publish({10: 1}, {1: 7})
+        hub.publish({10: 1}, {1: 8})
+        self.assertEqual(hub.snapshot(1), (1, {10: 5}))
+        await updates.aclose()
+
+
+@override_settings(POLLS_LIVE_UPDATES_PER_SECOND=1000)
+class ResultsStreamTests(TestCase):
+
+    def setUp(self):
+        self.question = Question.objects.create(
+            question_text="Live question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First")
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second")
+        self.user = User.objects.create_user(username='voter')
+
+    def event_data(self, event):
+        event = event.decode()
+        self.assertIn("event: tally", event)
+        return json.loads(event.split("data: ", 1)[1])
+
+    async def test_stream_pushes_changed_counts(self):
+        """The stream starts with all counts, then sends the changes."""
+        response = await self.async_client.get(
+            reverse('polls:results_stream', args=(self.question.id,)))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        first = self.event_data(await anext(events))
+        self.assertEqual(first, {'counts': {str(self.first.id): 0,
+                                            str(self.second.id): 0},
+                                 'total': 0})
+
+        def vote():
+            with self.captureOnCommitCallbacks(execute=True):
+                Vote.objects.cast(self.user, self.second)
+
+        await sync_to_async(vote)()
+        update = self.event_data(await asyncio.wait_for(anext(events), 5))
+        self.assertEqual(update, {'counts': {str(self.second.id): 1},
+                                  'total': 1})
+        await events.aclose()
+
+    async def test_results_page_subscribes(self):
+        """Under ASGI the results page of an open poll follows the
+        stream."""
+        response = await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, reverse('polls:results_stream',
+                                              args=(self.question.id,)))
+
+    def test_no_stream_under_wsgi(self):
+        """Under WSGI the page doesn't subscribe and the stream is 404."""
+        stream_url = reverse('polls:results_stream', args=(self.question.id,))
+        response = self.client.get(reverse('polls:results',
+                                           args=(self.question.id,)))
+        self.assertNotContains(response, stream_url)
+        self.assertEqual(self.client.get(stream_url).status_code, 404)
@@ -0,0 +1,127 @@
+"""Tests of the queue-based logging pipeline."""
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from polls import logs, metrics
+
+
+class QueueHandlerTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.logger = logging.getLogger('polls.test_logs')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def handler(self, start=True, **kwargs):
+        handler = logs.QueueHandler(self.directory / 'polls.log',
+                                    console_level=None, **kwargs)
+        if start:
+            handler.start()
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def lines(self, name='polls.log'):
+        return (self.directory / name).read_text().splitlines()
+
+    def test_records_are_written_on_close(self):
+        """Closing the handler drains the queue into the file."""
+        handler = self.handler()
+        for n in range(1200):
+            self.logger.info("record %s", n)
+        handler.close()
+        lines = self.lines()
+        self.assertEqual(len(lines), 1200)
+        self.assertTrue(lines[0].startswith("INFO "))
+        self.assertTrue(lines[-1].endswith("record 1199"))
+
+    def test_unstarted_handler_writes_synchronously(self):
+        """Before start(), as in management commands, there's no thread
+        and each record is written at once."""
+        handler = self.handler(start=False)
+        self.logger.info("record")
+        self.assertIsNone(handler.listener._thread)
+        lines = self.lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith("record"))
+
+    def test_external_rotation(self):
+        """A file moved away by logrotate is reopened, not written on."""
+        handler = self.handler()
+        self.logger.info("before")
+        handler.queue.join()
+        (self.directory / 'polls.log').rename(self.directory / 'polls.log.1')
+        self.logger.info("after")
+        handler.close()
+        self.assertTrue(self.lines('polls.log.1')[0].endswith("before"))
+        self.assertEqual(len(self.lines()), 1)
+        self.assertTrue(self.lines()[0].endswith("after"))
+
+    def test_json(self):
+        """The JSON format writes one object a line, extras included."""
+        handler = self.handler(json=True)
+        self.logger.warning("profile queries=%s", 3,
+                            extra={'profile': {'queries': 3}})
+        handler.close()
+        entry = json.loads(self.lines()[0])
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['message'], "profile queries=3")
+        self.assertEqual(entry['profile'], {'queries': 3})
+
+    def test_full_queue_drops_and_reports(self):
+        """A full queue drops records, counts and then logs the drops."""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(POLLS_METRICS_DIR=directory):
+            handler = self.handler(queue_size=2)
+            # With no listener nothing leaves the queue.
+            handler.listener.stop()
+            for n in range(5):
+                self.logger.info("record %s", n)
+            self.assertEqual(handler.dropped, 3)
+            self.assertEqual(
+                metrics.collect()['polls_log_records_dropped_total'], 3)
+            handler.listener.start()
+            handler.close()
+        lines = self.lines()
+        self.assertIn("Dropped 3 log record(s)", lines[0])
+        self.assertEqual(len(lines), 3)
+
+    def test_block_policy_waits_before_dropping(self):
+        handler = self.handler(queue_size=1, policy='block',
+                               block_timeout=0.01)
+        handler.listener.stop()
+        self.logger.info("kept")
+        self.logger.info("dropped")
+        self.assertEqual(handler.dropped, 1)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            logs.QueueHandler(self.directory / 'polls.log', policy='spill')
+
+    def test_settings_configure(self):
+        """dictConfig() takes settings.LOGGING, Python 3.12 included, which
+        wants a queue and listener for stdlib QueueHandler subclasses."""
+        self.assertFalse(issubclass(logs.QueueHandler,
+                                    logging.handlers.QueueHandler))
+        # In a child process, so the test run's handlers stay open.
+        subprocess.run([sys.executable, '-c', (
+            'import logging.config\n'
+            'from django.conf import settings\n'
+            'logging.config.dictConfig(settings.LOGGING)\n'
+            'logging.getLogger("polls").info("configured")\n')],
+            cwd=self.directory, check=True, capture_output=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'mysite.settings',
+                 'PYTHONPATH': str(settings.BASE_DIR)})
+        self.assertTrue(self.lines()[0].endswith("configured"))
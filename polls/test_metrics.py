@@ -0,0 +1,117 @@
+"""Tests of the process-shared metrics."""
+import datetime
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import metrics
+from polls.models import Choice, Question
+from polls.test_cache import use_shared_cache
+
+
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(POLLS_METRICS_DIR=directory.name,
+                                     POLLS_METRICS_TOKEN='scraper')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class StoreTests(MetricsTestCase):
+
+    def test_processes_are_added_up(self):
+        """Series of other processes' files count towards the totals."""
+        metrics.VOTES_ACCEPTED.inc()
+        other = metrics._Store(f"{self.directory}/1.db")
+        other.add('polls_votes_accepted_total', 2)
+        self.assertEqual(metrics.collect()['polls_votes_accepted_total'], 3)
+
+    def test_store_grows_and_reopens(self):
+        """A store outgrowing its file keeps its values after reopening."""
+        path = f"{self.directory}/1.db"
+        store = metrics._Store(path)
+        for n in range(3000):
+            store.add(f'series_{n}', n)
+        self.assertEqual(metrics._Store(path)._offsets.keys(),
+                         store._offsets.keys())
+        self.assertEqual(metrics.collect()['series_2999'], 2999)
+
+    def test_exposition(self):
+        metrics.VOTES_REJECTED.inc(reason='closed')
+        metrics.VOTE_SECONDS.observe(0.02)
+        text = metrics.exposition()
+        self.assertIn('# TYPE polls_votes_rejected_total counter', text)
+        self.assertIn('polls_votes_rejected_total{reason="closed"} 1.0',
+                      text)
+        self.assertIn('polls_vote_seconds_bucket{le="0.01"} 0.0', text)
+        self.assertIn('polls_vote_seconds_bucket{le="0.025"} 1.0', text)
+        self.assertIn('polls_vote_seconds_count 1.0', text)
+
+    def test_labels_are_checked(self):
+        with self.assertRaises(ValueError):
+            metrics.VOTES_REJECTED.inc()
+
+    @override_settings(POLLS_METRICS_DIR='')
+    def test_disabled(self):
+        metrics.VOTES_ACCEPTED.inc()
+        self.assertEqual(metrics.collect(), {})
+
+
+class InstrumentationTests(MetricsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='voter')
+        self.question = Question.objects.create(
+            question_text="Measured question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Yes")
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        response = self.client.get(reverse('polls:metrics'),
+                                   HTTP_AUTHORIZATION='Bearer scraper')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_votes_and_db_time_are_counted(self):
+        url = reverse('polls:vote', args=(self.question.pk,))
+        self.client.post(url, {'choice': self.choice.pk})
+        self.client.post(url, {})
+        text = self.scrape()
+        self.assertIn('polls_votes_accepted_total 1.0', text)
+        self.assertIn('polls_votes_rejected_total{reason="no_choice"} 1.0',
+                      text)
+        self.assertIn('polls_vote_seconds_count 2.0', text)
+        self.assertIn('polls_requests_total{endpoint="polls:vote"} 2.0',
+                      text)
+        self.assertIn('polls_db_seconds_total{endpoint="polls:vote"}', text)
+
+    def test_listing_cache(self):
+        use_shared_cache(self)
+        self.client.get(reverse('polls:index'))
+        self.client.get(reverse('polls:index'))
+        text = self.scrape()
+        self.assertIn(
+            'polls_listing_cache_requests_total{result="hit"} 1.0', text)
+
+    def test_clients_without_the_token_are_refused(self):
+        url = reverse('polls:metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer guess')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(POLLS_METRICS_TOKEN='')
+    def test_no_token_set(self):
+        """Without a token configured, nobody can read the metrics."""
+        response = self.client.get(reverse('polls:metrics'),
+                                   HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,103 @@
+"""Tests of the keyset-paginated poll index."""
+import datetime
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import pagination
+from polls.models import Question
+
+
+class IndexPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        day = datetime.timedelta(days=1)
+        # Pairs of questions share a publication date, so pages have to
+        # break ties by id.
+        cls.published = [
+            Question.objects.create(question_text=f"Published {n}",
+                                    pub_date=now - (n // 2 + 1) * day)
+            for n in range(12)]
+        cls.closed = Question.objects.create(
+            question_text="Closed", pub_date=now - 30 * day,
+            end_date=now - 20 * day)
+        cls.upcoming = Question.objects.create(
+            question_text="Upcoming", pub_date=now + day)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, name, url_name='polls:index'):
+        """Return the questions of every page of filter name, in order."""
+        seen = []
+        data = {'filter': name}
+        while True:
+            response = self.client.get(reverse(url_name), data)
+            self.assertEqual(response.status_code, 200)
+            page = response.context['latest_question_list']
+            self.assertLessEqual(len(page), pagination.PAGE_SIZE)
+            seen.extend(page)
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                return seen
+            data['cursor'] = cursor
+
+    def newest_first(self, questions):
+        return sorted(questions, key=lambda q: (q.pub_date, q.pk),
+                      reverse=True)
+
+    def test_pages_cover_every_question_once(self):
+        self.assertEqual(self.walk('all'),
+                         self.newest_first(self.published + [self.closed]))
+
+    def test_filters(self):
+        self.assertEqual(len(self.walk('open')), 12)
+        self.assertEqual(self.walk('closed'), [self.closed])
+        self.assertEqual(self.walk('upcoming'), [self.upcoming])
+
+    def test_upcoming_soonest_first(self):
+        """Upcoming polls page from the next to be published on."""
+        now = timezone.now()
+        upcoming = [self.upcoming] + [
+            Question.objects.create(
+                question_text=f"Upcoming {n}",
+                pub_date=now + datetime.timedelta(days=n // 2 + 2))
+            for n in range(6)]
+        soonest_first = sorted(upcoming, key=lambda q: (q.pub_date, q.pk))
+        self.assertEqual(self.walk('upcoming'), soonest_first)
+        self.assertEqual(self.walk('upcoming', 'polls:async_index'),
+                         soonest_first)
+        response = self.client.get(reverse('polls:index'),
+                                   {'filter': 'upcoming'})
+        self.assertContains(response, "Later polls")
+
+    def test_async_index_pages(self):
+        self.assertEqual(self.walk('all', 'polls:async_index'),
+                         self.walk('all'))
+
+    def test_page_is_one_query(self):
+        ordered = self.newest_first(self.published)
+        position = pagination.decode(pagination.encode(ordered[4]))
+        with self.assertNumQueries(1):
+            page, cursor = pagination.split(list(
+                pagination.queryset('all', position)))
+        self.assertEqual(page, ordered[5:10])
+        self.assertIsNotNone(cursor)
+
+    def test_next_link(self):
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Older polls")
+        self.assertContains(
+            response, quote(response.context['next_cursor'], safe='/'))
+
+    def test_bad_cursor_or_filter(self):
+        cursor = pagination.encode(self.published[0])
+        for data in ({'cursor': cursor[:-2]}, {'cursor': 'junk'},
+                     {'filter': 'everything'}):
+            response = self.client.get(reverse('polls:index'), data)
+            self.assertEqual(response.status_code, 404)
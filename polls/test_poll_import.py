@@ -0,0 +1,136 @@
+"""Tests of bulk poll creation and the import_polls command."""
+import datetime
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from polls import cache, poll_import
+from polls.models import Choice, Question
+
+
+class CreatePollsTests(TestCase):
+
+    def test_two_inserts(self):
+        """Questions and choices are each created with one insert."""
+        polls = [(Question(question_text=f"Q{n}"), ["A", "B"])
+                 for n in range(10)]
+        with self.assertNumQueries(4):  # Savepoint, two inserts, release.
+            questions = Question.objects.create_polls(polls)
+        self.assertTrue(all(question.pk for question in questions))
+        self.assertEqual(Choice.objects.filter(
+            question__in=questions).count(), 20)
+
+    def test_all_or_nothing(self):
+        """A failed choice insert leaves no question behind."""
+        with mock.patch.object(Choice.objects, 'bulk_create',
+                               side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            Question.objects.create_polls([(Question(question_text="Q"),
+                                            ["A"])])
+        self.assertFalse(Question.objects.exists())
+
+    def test_drops_cached_listings(self):
+        """The listings are dropped after the commit, not before it."""
+        with mock.patch.object(cache, 'bump') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                Question.objects.create_polls([(Question(question_text="Q"),
+                                                [])])
+                bump.assert_not_called()
+        bump.assert_called_once_with()
+
+
+class ReadTests(TestCase):
+
+    def test_csv(self):
+        """Columns other than the question's fields are choices."""
+        text = ("question_text,pub_date,choice1,choice2,choice3\n"
+                "Tea?,2024-01-01T00:00:00,Yes,No,\n"
+                "\n"
+                "Coffee?,,Yes\n")
+        self.assertEqual(list(poll_import.read_csv(StringIO(text))), [
+            {'question_text': "Tea?", 'pub_date': "2024-01-01T00:00:00",
+             'choices': ["Yes", "No"]},
+            {'question_text': "Coffee?", 'pub_date': "", 'choices': ["Yes"]},
+        ])
+
+    def test_csv_without_question_text(self):
+        with self.assertRaises(ValueError):
+            list(poll_import.read_csv(StringIO("text,choice\nA,B\n")))
+
+    def test_to_poll(self):
+        question, choices = poll_import.to_poll({
+            'question_text': "Tea?", 'pub_date': "2024-01-01T00:00:00",
+            'end_date': "2024-01-02T00:00:00+00:00",
+            'choices': ["Yes", "No"]}, 1)
+        self.assertTrue(timezone.is_aware(question.pub_date))
+        self.assertEqual(question.end_date, datetime.datetime(
+            2024, 1, 2, tzinfo=datetime.timezone.utc))
+        self.assertEqual(choices, ["Yes", "No"])
+
+    def test_invalid_polls(self):
+        for record in [{},
+                       {'question_text': "x" * 201},
+                       {'question_text': "Q", 'pub_date': "yesterday"},
+                       {'question_text': "Q", 'choices': "Yes"},
+                       {'question_text': "Q", 'choices': [""]},
+                       {'question_text': "Q", 'pub_date': "2024-01-02",
+                        'end_date': "2024-01-01"}]:
+            with self.subTest(record=record), \
+                    self.assertRaisesRegex(ValueError, "^Poll 7: "):
+                poll_import.to_poll(record, 7)
+
+
+class ImportPollsCommandTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, text):
+        path = self.directory / name
+        path.write_text(text, encoding='utf-8')
+        return str(path)
+
+    def test_json(self):
+        path = self.write('polls.json', json.dumps([
+            {'question_text': f"Q{n}", 'choices': ["A", "B", "C"]}
+            for n in range(5)]))
+        out = StringIO()
+        call_command('import_polls', path, batch_size=2, stdout=out)
+        self.assertEqual(Question.objects.count(), 5)
+        self.assertEqual(Choice.objects.count(), 15)
+        self.assertIn("Created 5 poll(s) and 15 choice(s)", out.getvalue())
+        self.assertIn("polls/s", out.getvalue())
+
+    def test_csv(self):
+        path = self.write('polls.csv', "question_text,a,b\nQ1,Yes,No\n")
+        call_command('import_polls', path, stdout=StringIO())
+        self.assertQuerySetEqual(
+            Choice.objects.filter(question__question_text="Q1")
+            .order_by('pk').values_list('choice_text', flat=True),
+            ["Yes", "No"])
+
+    def test_invalid_poll_keeps_earlier_batches(self):
+        """Batches before the invalid poll stay committed."""
+        path = self.write('polls.json', json.dumps(
+            [{'question_text': "Q1"}, {'question_text': "Q2"}, {}]))
+        with self.assertRaisesRegex(CommandError,
+                                    "after 2 poll.*Poll 3: question_text"):
+            call_command('import_polls', path, batch_size=2,
+                         stdout=StringIO())
+        self.assertEqual(Question.objects.count(), 2)
+
+    def test_unknown_format(self):
+        path = self.write('polls.txt', "[]")
+        with self.assertRaisesRegex(CommandError, "--format"):
+            call_command('import_polls', path, stdout=StringIO())
+        call_command('import_polls', path, format='json', stdout=StringIO())
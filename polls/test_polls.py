@@ -69,6 +69,48 @@ class TestQuestionModel:
         )
         assert question.can_vote() is False
 
+@pytest.mark.django_db
+class TestQuestionQuerySet:
+    @pytest.fixture
+    def questions(self):
+        now = timezone.now()
+        day = datetime.timedelta(days=1)
+        dates = {
+            'upcoming': (now + day, None),
+            'recent': (now - day / 2, None),
+            'ending': (now - 2 * day, now + day),
+            'closed': (now - 3 * day, now - day),
+        }
+        return {name: Question.objects.create(question_text=name,
+                                              pub_date=pub_date,
+                                              end_date=end_date)
+                for name, (pub_date, end_date) in dates.items()}
+
+    @staticmethod
+    def names(queryset):
+        return set(queryset.values_list('question_text', flat=True))
+
+    def test_predicates(self, questions):
+        assert self.names(Question.objects.published()) == {
+            'recent', 'ending', 'closed'}
+        assert self.names(Question.objects.upcoming()) == {'upcoming'}
+        assert self.names(Question.objects.open()) == {'recent', 'ending'}
+        assert self.names(Question.objects.closed()) == {'closed'}
+        assert self.names(Question.objects.recent()) == {'recent'}
+
+    def test_predicates_agree_with_methods(self, questions):
+        for question in Question.objects.with_voting_open():
+            assert question.voting_open is question.can_vote()
+        assert self.names(Question.objects.open()) == {
+            question.question_text for question in questions.values()
+            if question.can_vote()}
+
+    def test_detail_redirects_closed_question(self, client, questions):
+        response = client.get(reverse('polls:detail',
+                                      args=(questions['closed'].pk,)))
+        assert response.status_code == 302
+        assert response.url == reverse('polls:index')
+
 @pytest.mark.django_db(transaction=True)
 class TestChoiceModel:
     @pytest.fixture
@@ -0,0 +1,52 @@
+"""Tests of the request profiling middleware."""
+import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question
+
+
+@override_settings(POLLS_PROFILE_SAMPLE_RATE=1.0, POLLS_PROFILE_HEADER=True)
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.question = Question.objects.create(
+            question_text="Profiled question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        Choice.objects.create(question=self.question, choice_text="Yes")
+
+    def timings(self, response):
+        return {entry.split(';')[0]: entry
+                for entry in response['Server-Timing'].split(', ')}
+
+    def test_server_timing(self):
+        """A sampled request reports its queries and timings."""
+        with self.assertLogs('polls', 'INFO') as logs:
+            response = self.client.get(reverse('polls:results',
+                                               args=(self.question.pk,)))
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'template', 'total'})
+        self.assertIn('desc="2 queries"', timings['db'])
+        record = [r for r in logs.records if hasattr(r, 'profile')][0]
+        self.assertEqual(record.profile['queries'], 2)
+        self.assertEqual(record.profile['status'], 200)
+        self.assertGreater(record.profile['template_ms'], 0)
+
+    async def test_async_view(self):
+        """Queries made through the async ORM are counted too."""
+        response = await self.async_client.get(
+            reverse('polls:async_results', args=(self.question.pk,)))
+        self.assertIn('desc="2 queries"', self.timings(response)['db'])
+
+    @override_settings(POLLS_PROFILE_HEADER=False)
+    def test_log_only(self):
+        with self.assertLogs('polls', 'INFO'):
+            response = self.client.get(reverse('polls:index'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(POLLS_PROFILE_SAMPLE_RATE=0.0)
+    def test_not_sampled(self):
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotIn('Server-Timing', response)
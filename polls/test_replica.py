@@ -0,0 +1,99 @@
+"""Tests of the read replica routing."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import replica
+from polls.models import Choice, Question, Vote
+from polls.test_cache import use_shared_cache
+
+
+@override_settings(POLLS_REPLICA_DATABASE='replica')
+class ReplicaTests(TransactionTestCase):
+    """The 'replica' test database stands in for a lagging replica: rows
+    are only there when a test puts them there."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        # The router keeps flush, like migrate, off the replica.
+        self.addCleanup(Question.objects.using('replica').delete)
+        self.user = User.objects.create_user(username='reader', is_staff=True)
+        self.client.force_login(self.user)
+
+    def publish(self, *databases):
+        """Create the same poll with one choice in each of databases."""
+        pub_date = timezone.now() - datetime.timedelta(days=1)
+        for database in databases:
+            question = Question.objects.using(database).create(
+                pk=1, question_text="Replicated question", pub_date=pub_date)
+            choice = Choice.objects.using(database).create(
+                pk=1, question=question, choice_text="Only choice")
+        return question, choice
+
+    def test_index_reads_the_replica(self):
+        self.publish('default')
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, "Replicated question")
+        self.publish('replica')
+        cache.clear()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Replicated question")
+
+    def test_cached_listing_is_built_from_the_primary(self):
+        """A listing shared through the cache never comes from the lagging
+        replica, in sync and async views alike."""
+        use_shared_cache(self)
+        self.publish('default')
+        for name in ('polls:index', 'polls:async_index'):
+            cache.clear()
+            self.assertContains(self.client.get(reverse(name)),
+                                "Replicated question")
+
+    def test_replica_is_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica', 'polls'))
+        self.assertTrue(router.allow_migrate('default', 'polls'))
+
+    def test_voter_reads_their_own_vote(self):
+        """After a vote the voter reads the results from the primary."""
+        question, choice = self.publish('default', 'replica')
+        response = self.client.post(reverse('polls:vote', args=(question.pk,)),
+                                    {'choice': choice.pk})
+        self.assertIn(replica.PIN_COOKIE, response.cookies)
+        self.assertEqual(Vote.objects.using('default').count(), 1)
+        self.assertFalse(Vote.objects.using('replica').exists())
+
+        url = reverse('polls:results', args=(question.pk,))
+        self.assertContains(self.client.get(url), "Total: 1 vote")
+        del self.client.cookies[replica.PIN_COOKIE]
+        self.assertContains(self.client.get(url), "Total: 0 votes")
+
+    def test_async_results_read_the_replica(self):
+        question, _ = self.publish('replica')
+        response = self.client.get(reverse('polls:async_results',
+                                           args=(question.pk,)))
+        self.assertContains(response, "Replicated question")
+
+    def test_export_reads_the_replica(self):
+        self.publish('replica')
+        response = self.client.get(reverse('polls:export',
+                                           args=('results', 'csv')))
+        self.assertIn(b"Replicated question",
+                      b''.join(response.streaming_content))
+
+    @override_settings(POLLS_REPLICA_DATABASE='')
+    def test_no_replica(self):
+        """Without a replica everything is read from the primary and
+        nobody is pinned."""
+        question, choice = self.publish('default')
+        response = self.client.post(reverse('polls:vote', args=(question.pk,)),
+                                    {'choice': choice.pk})
+        self.assertNotIn(replica.PIN_COOKIE, response.cookies)
+        self.assertContains(self.client.get(reverse('polls:index')),
+                            "Replicated question")
@@ -0,0 +1,132 @@
+"""Tests of the results page."""
+import datetime
+import time
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from polls.models import Choice, Question, Vote
+
+
+class ResultsViewTests(TestCase):
+
+    def setUp(self):
+        self.question = Question.objects.create(
+            question_text="Results question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.choices = [
+            Choice.objects.create(question=self.question,
+                                  choice_text=f"Choice {n}")
+            for n in range(10)
+        ]
+        for n in range(4):
+            user = User.objects.create_user(username=f"user{n}")
+            choice = self.choices[0] if n < 3 else self.choices[1]
+            Vote.objects.create(user=user, choice=choice)
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_results_query_count(self):
+        """
+        Beyond the change marker lookup, the question, choices and tallies
+        cost a single query.
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_totals_and_percentages(self):
+        """The context exposes the total and each choice's percentage."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['total_votes'], 4)
+        choices = response.context['choices']
+        self.assertEqual([c.votes for c in choices[:3]], [3, 1, 0])
+        self.assertEqual([c.percentage for c in choices[:3]], [75.0, 25.0, 0])
+        self.assertContains(response, "75.0%")
+
+    def test_question_without_choices(self):
+        """A question without choices still renders, with no votes."""
+        question = Question.objects.create(question_text="Empty")
+        response = self.client.get(
+            reverse('polls:results', args=(question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_votes'], 0)
+
+    def test_missing_question(self):
+        """An unknown question id is a 404."""
+        response = self.client.get(reverse('polls:results', args=(9999,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_out_of_range_question(self):
+        """An id too large for the database is a 404 too, not a 500."""
+        for name in ('polls:results', 'polls:async_results'):
+            response = self.client.get(reverse(name, args=(10**20,)))
+            self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.question = Question.objects.create(
+            question_text="Conditional question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Only choice")
+        self.results_url = reverse('polls:results', args=(self.question.id,))
+        self.detail_url = reverse('polls:detail', args=(self.question.id,))
+
+    def test_unchanged_results_are_not_modified(self):
+        """A matching ETag gets a 304 after only the marker lookup."""
+        etag = self.client.get(self.results_url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.results_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified(self):
+        """
+        A vote within the same second as the page must not be answered
+        304, so only the ETag validates the results.
+        """
+        response = self.client.get(self.results_url)
+        self.assertNotIn('Last-Modified', response)
+        Vote.objects.cast(User.objects.create_user(username='voter'),
+                          self.choice)
+        response = self.client.get(
+            self.results_url, HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+        self.assertEqual(response.status_code, 200)
+
+    def test_vote_changes_etag(self):
+        """A new vote invalidates the results ETag."""
+        etag = self.client.get(self.results_url)['ETag']
+        user = User.objects.create_user(username='voter')
+        Vote.objects.cast(user, self.choice)
+        response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_choice_change_changes_etag(self):
+        """Editing a choice invalidates the ETags."""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.choice.choice_text = "Renamed"
+        self.choice.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Renamed")
+
+    def test_detail_etag_depends_on_user(self):
+        """The detail page is revalidated when the user changes."""
+        etag = self.client.get(self.detail_url)['ETag']
+        User.objects.create_user(username='voter', password='12345')
+        self.client.login(username='voter', password='12345')
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_closed_detail_has_no_etag(self):
+        """A closed poll still redirects instead of answering 304."""
+        self.question.end_date = timezone.now() - datetime.timedelta(hours=1)
+        self.question.save()
+        response = self.client.get(self.detail_url)
+        self.assertRedirects(response, reverse('polls:index'))
+        self.assertFalse(response.has_header('ETag'))
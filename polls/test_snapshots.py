@@ -0,0 +1,170 @@
+"""Tests of the frozen results of closed polls."""
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import buffer, snapshots
+from polls.buffer import VoteBuffer
+from polls.models import Choice, Question, ResultSnapshot, Vote
+
+
+def create_question(text, days_open, days_left):
+    """A question published days_open days ago that closes in days_left."""
+    now = timezone.now()
+    return Question.objects.create(
+        question_text=text, pub_date=now - datetime.timedelta(days=days_open),
+        end_date=now + datetime.timedelta(days=days_left))
+
+
+class SnapshotTests(TestCase):
+
+    def setUp(self):
+        self.question = create_question("Closed", days_open=2, days_left=-1)
+        self.choices = [Choice.objects.create(question=self.question,
+                                              choice_text=f"Choice {n}")
+                        for n in range(3)]
+        self.votes = []
+        for n in range(3):
+            user = User.objects.create_user(username=f"user{n}")
+            self.votes.append(Vote.objects.create(
+                user=user, choice=self.choices[min(n, 1)]))
+        self.url = reverse('polls:results', args=(self.question.pk,))
+
+    def test_frozen_on_first_request(self):
+        self.assertFalse(ResultSnapshot.objects.exists())
+        response = self.client.get(self.url)
+        snapshot = ResultSnapshot.objects.get(pk=self.question.pk)
+        self.assertEqual(snapshot.total, 3)
+        self.assertEqual(snapshot.counts, [
+            [self.choices[0].pk, "Choice 0", 1],
+            [self.choices[1].pk, "Choice 1", 2],
+            [self.choices[2].pk, "Choice 2", 0]])
+        self.assertEqual(response.context['total_votes'], 3)
+
+    def test_served_from_snapshot(self):
+        """Once frozen, results read no choice or vote rows."""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertNotIn('polls_choice', query['sql'])
+            self.assertNotIn('polls_vote', query['sql'])
+        self.assertEqual([choice.votes for choice in
+                          response.context['choices']], [1, 2, 0])
+        self.assertEqual([choice.percentage for choice in
+                          response.context['choices']], [33.3, 66.7, 0])
+        self.assertContains(response, "Choice 1")
+
+    def test_results_stay_frozen(self):
+        """Tallies changed after the snapshot don't reach the results."""
+        self.client.get(self.url)
+        self.votes[0].user.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['total_votes'], 3)
+
+    def test_frozen_etag(self):
+        """The ETag of frozen results still follows the question."""
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        self.question.refresh_from_db()
+        self.assertEqual(etag, f'"results-{self.question.pk}-frozen-'
+                               f'{self.question.modified.timestamp()}"')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.question.question_text = "Renamed"
+        self.question.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Renamed")
+
+    def test_not_frozen_during_grace_period(self):
+        """Votes accepted just before the end may still be on their way."""
+        question = create_question("Just closed", days_open=1, days_left=0)
+        question.end_date = timezone.now() - datetime.timedelta(seconds=1)
+        question.save()
+        frozen = ResultSnapshot.objects.filter(pk=question.pk)
+        self.client.get(reverse('polls:results', args=(question.pk,)))
+        self.assertFalse(frozen.exists())
+        snapshots.sweep()
+        self.assertFalse(frozen.exists())
+        with override_settings(POLLS_SNAPSHOT_GRACE_SECONDS=0):
+            snapshots.sweep()
+        self.assertTrue(frozen.exists())
+
+    @override_settings(POLLS_VOTE_BUFFER={
+        'ENABLED': True, 'FLUSH_INTERVAL_MS': 10, 'MAX_BATCH': 10,
+        'MAX_QUEUE': 10, 'BLOCK_MS': 10})
+    def test_buffered_votes_are_flushed_first(self):
+        vote_buffer = VoteBuffer(max_queue=10)
+        self.addCleanup(setattr, buffer, '_buffer', None)
+        buffer._buffer = vote_buffer
+        late = User.objects.create_user(username="late")
+        vote_buffer.submit(late.pk, self.choices[2])
+        self.assertEqual(snapshots.freeze(self.question).total, 4)
+
+    def test_open_poll_is_not_frozen(self):
+        question = create_question("Open", days_open=1, days_left=1)
+        self.client.get(reverse('polls:results', args=(question.pk,)))
+        self.assertFalse(ResultSnapshot.objects.filter(
+            pk=question.pk).exists())
+
+    def test_reopened_poll_is_thawed(self):
+        self.client.get(self.url)
+        self.question.end_date = timezone.now() + datetime.timedelta(days=1)
+        self.question.save()
+        self.assertFalse(ResultSnapshot.objects.exists())
+
+    def test_snapshot_is_immutable(self):
+        snapshot = snapshots.freeze(self.question)
+        snapshot = ResultSnapshot.objects.get(pk=snapshot.pk)
+        snapshot.total = 0
+        with self.assertRaises(ValueError):
+            snapshot.save()
+
+    def test_freeze_twice_keeps_the_first(self):
+        """A second freeze returns the stored snapshot, not its own."""
+        snapshots.freeze(self.question)
+        Choice.objects.filter(pk=self.choices[2].pk).update(vote_count=5)
+        self.assertEqual(snapshots.freeze(self.question).total, 3)
+        self.assertEqual(ResultSnapshot.objects.get().total, 3)
+
+    def test_api_results_are_frozen(self):
+        url = reverse('polls:api_results', args=(self.question.pk,))
+        self.client.get(url)
+        self.votes[0].user.delete()
+        data = self.client.get(url).json()
+        self.assertEqual(data['vote_total'], 3)
+        self.assertEqual([choice['votes'] for choice in data['choices']],
+                         [1, 2, 0])
+
+    async def test_async_results(self):
+        url = reverse('polls:async_results', args=(self.question.pk,))
+        await self.async_client.get(url)
+        self.assertTrue(await ResultSnapshot.objects.filter(
+            pk=self.question.pk).aexists())
+        response = await self.async_client.get(url)
+        self.assertEqual(response.context['total_votes'], 3)
+
+
+class FreezeResultsCommandTests(TestCase):
+
+    def test_sweep(self):
+        """Only closed polls without a snapshot are frozen."""
+        closed = [create_question(f"Closed {n}", days_open=3, days_left=-1)
+                  for n in range(5)]
+        create_question("Open", days_open=1, days_left=1)
+        create_question("Upcoming", days_open=-1, days_left=2)
+        out = StringIO()
+        call_command('freeze_results', batch_size=2, stdout=out)
+        self.assertIn("Froze the results of 5 closed poll(s)", out.getvalue())
+        self.assertCountEqual(
+            ResultSnapshot.objects.values_list('pk', flat=True),
+            [question.pk for question in closed])
+        self.assertEqual(snapshots.sweep(), 0)
@@ -0,0 +1,70 @@
+"""Tests of the materialized vote tallies."""
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import tallies
+from polls.models import Choice, Question, Vote
+
+
+class TallyTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='voter',
+                                             password='12345')
+        self.question = Question.objects.create(
+            question_text="Tally question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First")
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second")
+
+    def assertTallies(self, first, second):
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.question.refresh_from_db()
+        self.assertEqual(self.first.votes, first)
+        self.assertEqual(self.second.votes, second)
+        self.assertEqual(self.question.vote_total, first + second)
+
+    def test_create_and_delete_vote(self):
+        """Saving and deleting a Vote moves the stored tallies."""
+        vote = Vote.objects.create(user=self.user, choice=self.first)
+        self.assertTallies(1, 0)
+        vote.delete()
+        self.assertTallies(0, 0)
+
+    def test_changing_vote_moves_tally(self):
+        """Voting again for another choice moves the tally to it."""
+        self.client.login(username='voter', password='12345')
+        url = reverse('polls:vote', args=(self.question.id,))
+        self.client.post(url, {'choice': self.first.id})
+        self.client.post(url, {'choice': self.second.id})
+        self.assertTallies(0, 1)
+
+    def test_cascade_delete_uncounts(self):
+        """Deleting a user removes their votes from the tallies."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        self.user.delete()
+        self.assertTallies(0, 0)
+
+    def test_rebuild_fixes_drift(self):
+        """rebuild_tallies recomputes tallies changed behind its back."""
+        Vote.objects.bulk_create([Vote(user=self.user, choice=self.second,
+                                       question=self.question)])
+        Choice.objects.filter(pk=self.first.pk).update(vote_count=7)
+        self.assertEqual(tallies.drifted_choices().count(), 2)
+        modified = Question.objects.get(pk=self.question.pk).modified
+        out = StringIO()
+        call_command('rebuild_tallies', stdout=out)
+        self.assertIn("2 choice(s) had drifted", out.getvalue())
+        self.assertTallies(0, 1)
+        # The results ETag moves with the corrected counts.
+        self.assertGreater(Question.objects.get(pk=self.question.pk).modified,
+                           modified)
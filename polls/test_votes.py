@@ -0,0 +1,201 @@
+"""Tests of recording votes."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+
+
+class VoteCastTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='voter')
+        self.question = Question.objects.create(
+            question_text="Cast question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First")
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second")
+
+    def test_first_vote_is_inserted(self):
+        """A first vote has no previous choice."""
+        vote, previous = Vote.objects.cast(self.user, self.first)
+        self.assertIsNone(previous)
+        self.assertEqual(vote.question, self.question)
+
+    def test_changed_vote_is_updated_in_place(self):
+        """Changing a vote keeps the same row and moves the tally."""
+        vote, _ = Vote.objects.cast(self.user, self.first)
+        changed, previous = Vote.objects.cast(self.user, self.second)
+        self.assertEqual(changed.pk, vote.pk)
+        self.assertEqual(previous, self.first)
+        self.assertEqual(Vote.objects.get().choice, self.second)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.votes, 1)
+
+    def test_same_vote_is_unchanged(self):
+        """Voting twice for the same choice leaves a single vote."""
+        Vote.objects.cast(self.user, self.first)
+        _, previous = Vote.objects.cast(self.user, self.first)
+        self.assertEqual(previous, self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_database_rejects_second_vote(self):
+        """The database allows one vote per user per question."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(user=self.user, choice=self.second)
+
+
+class VoteCastManyTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='voter')
+        self.other = User.objects.create_user(username='other')
+        self.question = Question.objects.create(
+            question_text="Batch question",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First")
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second")
+
+    def test_latest_vote_in_batch_wins(self):
+        """A user's last vote on a question in a batch is the one kept."""
+        previous = Vote.objects.cast_many([
+            (self.user.pk, self.first), (self.other.pk, self.first),
+            (self.user.pk, self.second)])
+        self.assertEqual(previous, {(self.user.pk, self.question.pk): None,
+                                    (self.other.pk, self.question.pk): None})
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.second)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.question.refresh_from_db()
+        self.assertEqual((self.first.votes, self.second.votes), (1, 1))
+        self.assertEqual(self.question.vote_total, 2)
+
+    def test_existing_votes_are_changed(self):
+        """A batch changes stored votes in place and moves their tallies."""
+        vote, _ = Vote.objects.cast(self.user, self.first)
+        previous = Vote.objects.cast_many([(self.user.pk, self.second)])
+        self.assertEqual(previous, {(self.user.pk, self.question.pk):
+                                    self.first.pk})
+        self.assertEqual(Vote.objects.get().pk, vote.pk)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.question.refresh_from_db()
+        self.assertEqual((self.first.votes, self.second.votes), (0, 1))
+        self.assertEqual(self.question.vote_total, 1)
+
+
+class VoteBatchViewTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.user = User.objects.create_user(username='surveyor')
+        self.client.force_login(self.user)
+        self.questions = [Question.objects.create(
+            question_text=f"Survey question {n}",
+            pub_date=now - datetime.timedelta(days=1)) for n in range(3)]
+        self.choices = [[Choice.objects.create(question=question,
+                                               choice_text=f"Choice {c}")
+                         for c in range(2)] for question in self.questions]
+        self.closed = Question.objects.create(
+            question_text="Closed", pub_date=now - datetime.timedelta(days=2),
+            end_date=now - datetime.timedelta(days=1))
+        self.closed_choice = Choice.objects.create(question=self.closed,
+                                                   choice_text="Too late")
+
+    def post(self, votes, status=200):
+        response = self.client.post(
+            reverse('polls:vote_batch'), {'votes': [
+                {'question': question.pk, 'choice': choice.pk}
+                for question, choice in votes]},
+            content_type='application/json')
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def statuses(self, data):
+        return [item['status'] for item in data['results']]
+
+    def test_votes_are_recorded_together(self):
+        data = self.post([(q, c[0]) for q, c in zip(self.questions,
+                                                      self.choices)])
+        self.assertEqual(self.statuses(data), ['recorded'] * 3)
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 3)
+        self.questions[0].refresh_from_db()
+        self.assertEqual(self.questions[0].vote_total, 1)
+
+    def test_changed_and_unchanged(self):
+        """A second batch replaces votes like vote() does."""
+        Vote.objects.cast(self.user, self.choices[0][0])
+        Vote.objects.cast(self.user, self.choices[1][0])
+        data = self.post([(self.questions[0], self.choices[0][1]),
+                          (self.questions[1], self.choices[1][0])])
+        self.assertEqual(self.statuses(data), ['changed', 'unchanged'])
+        self.assertEqual(Vote.objects.get(question=self.questions[0]).choice,
+                         self.choices[0][1])
+        self.choices[0][0].refresh_from_db()
+        self.assertEqual(self.choices[0][0].votes, 0)
+
+    def test_rejected_items(self):
+        """Invalid votes are reported and the valid ones still recorded."""
+        missing = Question(pk=10**6)
+        data = self.post([
+            (self.closed, self.closed_choice),
+            (missing, self.closed_choice),
+            (self.questions[0], self.choices[1][0]),
+            (self.questions[1], self.choices[1][0]),
+            (self.questions[1], self.choices[1][1]),
+        ])
+        self.assertEqual(self.statuses(data), [
+            'closed', 'not_found', 'no_choice', 'duplicate', 'recorded'])
+        self.assertEqual(Vote.objects.get().choice, self.choices[1][1])
+
+    def test_invalid_later_vote_is_no_duplicate(self):
+        """An invalid vote doesn't displace a valid earlier one."""
+        data = self.post([(self.questions[0], self.choices[0][1]),
+                          (self.questions[0], self.choices[1][0])])
+        self.assertEqual(self.statuses(data), ['recorded', 'no_choice'])
+        self.assertEqual(Vote.objects.get().choice, self.choices[0][1])
+
+    def test_constant_queries(self):
+        """The number of queries doesn't grow with the batch."""
+        with self.assertNumQueries(11):
+            self.post([(self.questions[0], self.choices[0][0])])
+        Vote.objects.all().delete()
+        with self.assertNumQueries(11):
+            self.post([(q, c[0]) for q, c in zip(self.questions,
+                                                 self.choices)])
+
+    def test_bad_requests(self):
+        url = reverse('polls:vote_batch')
+        question, choice = self.questions[0].pk, self.choices[0][0].pk
+        for body, error in [
+                ('not json', "valid JSON"),
+                ('{"votes": []}', "Send at most"),
+                ('{"votes": [{"q": 1}]}', "Send at most"),
+                ('[1]', "Send at most"),
+                (f'{{"votes": [{{"question": true, "choice": {choice}}}]}}',
+                 "ids must be integers"),
+                (f'{{"votes": [{{"question": {question}, "choice": 1.0}}]}}',
+                 "ids must be integers"),
+                (f'{{"votes": [{{"question": {question}, "choice": 1e999}}]}}',
+                 "ids must be integers"),
+                (f'{{"votes": [{{"question": 0, "choice": {choice}}}]}}',
+                 "ids must be integers"),
+                (f'{{"votes": [{{"question": {question}, '
+                 f'"choice": {2**63}}}]}}', "ids must be integers")]:
+            response = self.client.post(url, body,
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn(error, response.json()['error'])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.logout()
+        self.post([(self.questions[0], self.choices[0][0])], status=401)
@@ -1,7 +1,7 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
 
-from . import views
+from . import api, async_views, views
 
 app_name = 'polls'
 urlpatterns = [
@@ -9,7 +9,23 @@ urlpatterns = [
     path('create/', views.create_poll, name='create'),
     path('<int:pk>/', views.DetailView.as_view(), name='detail'),
     path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
+    path('<int:pk>/results/stream/', async_views.results_stream,
+         name='results_stream'),
     path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('vote/batch/', views.vote_batch, name='vote_batch'),
+    path('export/<slug:dataset>.<slug:fmt>', views.export_data,
+         name='export'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('async/', async_views.index, name='async_index'),
+    path('async/<int:pk>/results/', async_views.results,
+         name='async_results'),
+    path('async/<int:question_id>/vote/', async_views.vote,
+         name='async_vote'),
+    path('api/questions/', api.question_list, name='api_list'),
+    path('api/questions/batch/', api.question_batch, name='api_batch'),
+    path('api/questions/<int:pk>/', api.question_detail, name='api_detail'),
+    path('api/questions/<int:pk>/results/', api.question_results,
+         name='api_results'),
     path('login/', auth_views.LoginView.as_view(), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
 ]
\ No newline at end of file
@@ -1,67 +1,155 @@
-from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.http import (HttpResponse, HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from .models import Choice, Question, Vote
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from .models import Choice, Question, ResultSnapshot, Vote
+from . import cache as listing_cache
+from . import conditional, export, live, metrics, pagination, snapshots
+from .api import MAX_ID
+from .buffer import get_buffer
+from .replica import reads_from_replica
+import json
 import logging
 from django.http import Http404
+from django.db import router
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 
 
+@method_decorator(reads_from_replica, name='dispatch')
 class IndexView(generic.ListView):
     template_name = 'polls/index.html'
     context_object_name = 'latest_question_list'
 
     def get_queryset(self):
         """
-        Return the last five published questions (not including those set to be
-        published in the future).
+        Return a page of five published questions (or of those picked by
+        ?filter=), newest first, starting after ?cursor=. The first page of
+        all published questions comes from the listing cache when possible.
         """
-        return Question.objects.filter(
-            pub_date__lte=timezone.now()
-        ).order_by('-pub_date')[:5]
+        self.filter, position = pagination.from_request(self.request)
 
+        def page():
+            return pagination.split(list(
+                pagination.queryset(self.filter, position)))
 
+        if self.filter == 'all' and position is None:
+            questions, self.next_cursor = listing_cache.listing('index:all',
+                                                                page)
+        else:
+            questions, self.next_cursor = page()
+        return questions
+
+    def get_context_data(self, **kwargs):
+        """Add the filters and the cursor of the next page."""
+        context = super().get_context_data(**kwargs)
+        context.update(filter=self.filter, filters=pagination.FILTERS,
+                       next_cursor=self.next_cursor)
+        return context
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=conditional.detail_etag),
+                  name='dispatch')
 class DetailView(generic.DetailView):
     model = Question
     template_name = 'polls/detail.html'
 
     def get_queryset(self):
         """
-        Excludes any questions that aren't published yet.
+        Load the question with the database's answer to whether it is
+        open for voting.
         """
-        return Question.objects.filter()
+        return Question.objects.with_voting_open()
 
     def get(self, request, *args, **kwargs):
         """
-        Check if Question is pending using self.object.can_vote().
+        Check if Question is pending using self.object.voting_open.
         If voting is not allowed, we set an error.
         Then, we redirect the user to the polls index page.
         """
         self.object = self.get_object()
-        if not self.object.can_vote():
+        if not self.object.voting_open:
             messages.error(request, "Voting is not allowed for this question.")
             return redirect('polls:index')
-        return super().get(request, *args, **kwargs)
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
 
+@method_decorator(reads_from_replica, name='dispatch')
+@method_decorator(cache_control(no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=conditional.results_etag),
+                  name='dispatch')
 class ResultsView(generic.DetailView):
     model = Question
     template_name = 'polls/results.html'
 
+    def get_object(self, queryset=None):
+        """
+        Fetch the question together with its choices and their tallies
+        in a single query. Only a question without choices needs a second
+        query to look itself up. The results of a closed question come
+        from its snapshot instead, frozen here on the first request once
+        the grace period of polls.snapshots is over.
+        """
+        pk = self.kwargs['pk']
+        # SQLite can't even compare a larger id with a foreign key.
+        if pk > MAX_ID:
+            raise Http404("No question found.")
+        if conditional.has_snapshot(self.request, pk):
+            snapshot = ResultSnapshot.objects.select_related(
+                'question').filter(pk=pk).first()
+            if snapshot is not None:
+                self.choices = snapshot.choices()
+                return snapshot.question
+        self.choices = list(
+            Choice.objects.filter(question_id=pk)
+            .select_related('question').order_by('pk'))
+        if not self.choices:
+            question = super().get_object(queryset)
+        else:
+            question = self.choices[0].question
+        if snapshots.freezable(question):
+            self.choices = snapshots.freeze(question).choices()
+        return question
+
+    def get_context_data(self, **kwargs):
+        """Add the choices with precomputed totals and percentages."""
+        context = super().get_context_data(**kwargs)
+        context.update(results_context(self.choices),
+                       live=live.available(self.request))
+        return context
+
+
+def results_context(choices):
+    """Return the results template context for a question's choices."""
+    total = sum(choice.votes for choice in choices)
+    for choice in choices:
+        choice.percentage = round(100 * choice.votes / total, 1) if total else 0
+    return {'choices': choices, 'total_votes': total}
+
 
 logger = logging.getLogger('polls')
 
+BUSY_MESSAGE = "Too many votes are coming in right now, please try again."
+
 
 @login_required
+@metrics.VOTE_SECONDS.time()
 def vote(request, question_id):
     # question = get_object_or_404(Question, pk=question_id)
     try:
-        question = Question.objects.get(pk=question_id)
+        question = Question.objects.with_voting_open().get(pk=question_id)
 
     except Question.DoesNotExist:
         logger.error(f"Question with id: {question_id} not found")
@@ -70,17 +158,15 @@ def vote(request, question_id):
     user = request.user
 
     # Ensure the question is open for voting
-    if not question.can_vote():
+    if not question.voting_open:
         logger.warning
+        if request.method == 'POST':
+            metrics.VOTES_REJECTED.inc(reason='closed')
         return render(request, 'polls/detail.html', {
             'question': question,
             'error_message': "The Question is not pending currently.",
         })
 
-    # Check if the user has already voted for this question
-    user_vote = Vote.objects.filter(user=user,
-                                    choice__question=question).last()
-
     if request.method == 'POST':
         # Handle the vote submission
         try:
@@ -89,34 +175,48 @@ def vote(request, question_id):
         except (KeyError, Choice.DoesNotExist):
             # Redisplay the question voting form if no choice was selected
             logger.warning("Invalid question id or didn't selected choice")
+            metrics.VOTES_REJECTED.inc(reason='no_choice')
             return render(request, 'polls/detail.html', {
                 'question': question,
                 'error_message': "You didn't select a choice.",
-                'user_vote': user_vote  # Show the user's previous vote
+                # Show the user's previous vote
+                'user_vote': Vote.objects.filter(user=user,
+                                                 question=question).first()
             })
 
-        # If the user has already voted,
-        # delete the old vote before saving the new one
-        if user_vote:
-            if user_vote.choice == selected_choice:
-                messages.info(request, f"You already voted for"
-                              f"'{user_vote.choice.choice_text}'.")
-            else:
-                user_vote.delete()
-                messages.info(request, f"Your previous vote for"
-                              f"'{user_vote.choice.choice_text}'"
-                              f"has been removed.")
+        # Queue the vote when write-behind is on, the flush thread
+        # replaces any earlier vote. A full queue refuses it rather than
+        # let it overtake an earlier vote still queued.
+        vote_buffer = get_buffer()
+        if vote_buffer:
+            if not vote_buffer.submit(user.pk, selected_choice, block=True):
+                metrics.VOTES_REJECTED.inc(reason='busy')
+                return render(request, 'polls/detail.html', {
+                    'question': question,
+                    'error_message': BUSY_MESSAGE,
+                }, status=503)
+            messages.success(request, f"Your vote "
+                             f"'{selected_choice.choice_text}'"
+                             f"was received.")
+            metrics.VOTES_ACCEPTED.inc()
+            logger.info("Vote queued for poll #{0}".format(question_id))
+            return HttpResponseRedirect(reverse('polls:results',
+                                                args=(question.id,)))
 
-                # Create a new vote for the selected choice
-                Vote.objects.create(user=user, choice=selected_choice)
-                messages.success(request,
-                                 f"Your vote '{selected_choice.choice_text}'"
-                                 f"was recorded.")
+        # Insert the vote, or change the user's existing vote in place
+        _, previous_choice = Vote.objects.cast(user, selected_choice)
+        if previous_choice == selected_choice:
+            messages.info(request, f"You already voted for"
+                          f"'{previous_choice.choice_text}'.")
         else:
-            Vote.objects.create(user=user, choice=selected_choice)
+            if previous_choice:
+                messages.info(request, f"Your previous vote for"
+                              f"'{previous_choice.choice_text}'"
+                              f"has been removed.")
             messages.success(request, f"Your vote "
                              f"'{selected_choice.choice_text}'"
                              f"was recorded.")
+        metrics.VOTES_ACCEPTED.inc()
 
         logger.info("Vote submitted for poll #{0}".format(question_id))
         return HttpResponseRedirect(reverse('polls:results',
@@ -125,10 +225,116 @@ def vote(request, question_id):
     # If it's a GET request, show the question and the user's previous vote
     return render(request, 'polls/detail.html', {
         'question': question,
-        'user_vote': user_vote  # Show the user's previous vote
+        'user_vote': Vote.objects.filter(user=user,
+                                         question=question).first()
     })
 
 
+VOTE_BATCH_MAX = 100
+BATCH_FORMAT_ERROR = (f"Send at most {VOTE_BATCH_MAX} votes as "
+                      '{"votes": [{"question": id, "choice": id}, ...]}.')
+BATCH_ID_ERROR = ("Question and choice ids must be integers from 1 to "
+                  f"{MAX_ID}.")
+
+
+def _batch_id(value):
+    """Return a question or choice id of a vote_batch body as an int,
+    raise ValueError unless it is one."""
+    # True is an int to Python and 1.5 would be truncated: neither is an id.
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(BATCH_ID_ERROR)
+    try:
+        pk = int(value)
+    except (ValueError, OverflowError):
+        raise ValueError(BATCH_ID_ERROR)
+    # The database can't even compare an id out of range.
+    if not 1 <= pk <= MAX_ID:
+        raise ValueError(BATCH_ID_ERROR)
+    return pk
+
+
+def _batch_items(request):
+    """Return the [(question id, choice id)] of a vote_batch request body,
+    raise ValueError with the reason if it isn't valid."""
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        raise ValueError("The request body isn't valid JSON.")
+    try:
+        items = [(_batch_id(item['question']), _batch_id(item['choice']))
+                 for item in body['votes']]
+    except (KeyError, TypeError, OverflowError):
+        raise ValueError(BATCH_FORMAT_ERROR)
+    if not 0 < len(items) <= VOTE_BATCH_MAX:
+        raise ValueError(BATCH_FORMAT_ERROR)
+    return items
+
+
+@require_POST
+@metrics.VOTE_SECONDS.time()
+def vote_batch(request):
+    """
+    Vote on many questions in one request, under the rules of vote(). The
+    body is {"votes": [{"question": id, "choice": id}, ...]}. Questions and
+    choices are checked with one query each, and the accepted votes are
+    written together by Vote.objects.cast_many. Each vote gets a status:
+    recorded, changed or unchanged when accepted, otherwise not_found,
+    closed, no_choice or duplicate (a later valid vote on the same question
+    in the batch wins).
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "Log in to vote."}, status=401)
+    try:
+        items = _batch_items(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    questions = Question.objects.with_voting_open().only('id').in_bulk(
+        {question_id for question_id, _ in items})
+    choices = Choice.objects.only('id', 'question_id').in_bulk(
+        {choice_id for _, choice_id in items})
+    statuses = []
+    last = {}
+    for n, (question_id, choice_id) in enumerate(items):
+        question = questions.get(question_id)
+        choice = choices.get(choice_id)
+        if question is None:
+            status = 'not_found'
+        elif not question.voting_open:
+            status = 'closed'
+        elif choice is None or choice.question_id != question_id:
+            status = 'no_choice'
+        else:
+            status = None
+            last[question_id] = n
+        if status in ('closed', 'no_choice'):
+            metrics.VOTES_REJECTED.inc(reason=status)
+        statuses.append(status)
+    # Only the last valid vote on a question counts.
+    accepted = []
+    for n, (question_id, choice_id) in enumerate(items):
+        if statuses[n] is None:
+            if last[question_id] == n:
+                accepted.append((request.user.pk, choices[choice_id]))
+            else:
+                statuses[n] = 'duplicate'
+
+    previous = Vote.objects.cast_many(accepted) if accepted else {}
+    results = []
+    for (question_id, choice_id), status in zip(items, statuses):
+        if status is None:
+            before = previous[(request.user.pk, question_id)]
+            status = ('recorded' if before is None else
+                      'unchanged' if before == choice_id else 'changed')
+        results.append({'question': question_id, 'choice': choice_id,
+                        'status': status})
+    if accepted:
+        metrics.VOTES_ACCEPTED.inc(len(accepted))
+    logger.info(f"Batch of {len(accepted)} votes submitted by "
+                f"{request.user.username}")
+    return JsonResponse({'results': results})
+
+
 def get_client_ip(request):
     """Get the visitor's IP address using request headers."""
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -159,22 +365,53 @@ def create_poll(request):
             messages.error(request, 'Question text is required.')
             return redirect('polls:create')
             
-        question = Question.objects.create(
-            question_text=question_text,
-            pub_date=timezone.now()
-        )
-        
         # Process choices
         total_forms = int(request.POST.get('choice_set-TOTAL_FORMS', 0))
-        for i in range(total_forms):
-            choice_text = request.POST.get(f'choice_set-{i}-choice_text')
-            if choice_text:
-                Choice.objects.create(
-                    question=question,
-                    choice_text=choice_text
-                )
+        choice_texts = [
+            choice_text for choice_text in (
+                request.POST.get(f'choice_set-{i}-choice_text')
+                for i in range(total_forms))
+            if choice_text]
+
+        # The question and its choices are saved together or not at all
+        [question] = Question.objects.create_polls([(
+            Question(question_text=question_text, pub_date=timezone.now()),
+            choice_texts)])
         
         messages.success(request, 'Poll created successfully.')
         return redirect('polls:detail', pk=question.id)
         
     return render(request, 'polls/create.html')
+
+
+@staff_member_required
+@reads_from_replica
+def export_data(request, dataset, fmt):
+    """Stream the votes or the results as CSV or NDJSON, for staff only."""
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        raise Http404("Unknown export.")
+    logger.info(f"User {request.user.username} exported {dataset}.{fmt}")
+    # The rows are read while streaming, after this view has returned,
+    # so they're sent to the database chosen now.
+    using = router.db_for_read(Vote)
+    # Under ASGI a sync iterator would be read into a list before sending.
+    lines = (export.aexport if live.available(request)
+             else export.export)(dataset, fmt, using=using)
+    return StreamingHttpResponse(
+        lines, content_type=export.FORMATS[fmt],
+        headers={'Content-Disposition':
+                 f'attachment; filename="{dataset}.{fmt}"'})
+
+
+def metrics_view(request):
+    """
+    The polls metrics of every worker, for a Prometheus scraper sending
+    POLLS_METRICS_TOKEN as its bearer token. The client address proves
+    nothing behind a reverse proxy, where every request comes from it.
+    """
+    token = settings.POLLS_METRICS_TOKEN
+    sent = request.headers.get('Authorization', '')
+    if not token or not constant_time_compare(sent, f'Bearer {token}'):
+        raise Http404("Not found.")
+    return HttpResponse(metrics.exposition(),
+                        content_type=metrics.CONTENT_TYPE)